@@ -2,81 +2,182 @@ import os
 import csv
 from itertools import islice
 import logging
+import tempfile
+
+from models import Product, format_kopecks, format_timestamp
+from storage.price_index import PriceIndex, CHANGES_FIELDNAMES
+from storage.columnar import ParquetSink
+from storage.csv_writer import BackgroundCSVWriter
 
 logger = logging.getLogger('Parser')
 
 
 class DBManager:
 
-    def __init__(self, db_path):
+    def __init__(self,
+                 db_path,
+                 delta_only=False,
+                 changes_path="",
+                 columnar_path="",
+                 archive_path="",
+                 flush_interval=5.0,
+                 fsync_interval=30.0):
+        """
+        Args:
+            db_path (str): Путь к products.csv
+            delta_only (bool): Писать в products.csv только продукты, у которых
+                изменились цены или наличие с прошлого запуска. Требует
+                changes_path: пропажа из наличия сохраняется только в ленте
+            changes_path (str): Путь к ленте изменений (старые и новые значения),
+                пустая строка - не вести ленту
+            columnar_path (str): Каталог колоночного хранилища Parquet, куда
+                дублируются записываемые строки. Пустая строка - не вести
+            archive_path (str): Каталог файлов дат, куда compact переносит
+                историю из products.csv. Читается вместе с ним при построении
+                индекса цен
+            flush_interval (float): Как часто (в секундах) фоновая запись
+                сбрасывает буфер в файл
+            fsync_interval (float): Как часто (в секундах) записанное
+                гарантированно сохраняется на диск (fsync)
+        """
+        if delta_only and not changes_path:
+            # Без ленты следующий запуск не узнает, что товар пропадал, и не
+            # запишет его возвращение в наличие по прежней цене
+            raise ValueError("delta_output требует changes_path")
+
         self.db_path = db_path
+        self.delta_only = delta_only
+        self.changes_path = changes_path
+        self.archive_path = archive_path
         self.fieldnames = [
             "shop", "datetime", "price_reg", 'price_promo', 'article', 'name',
             'category_path'
         ]
-        self._initialize_csv_file()
-
-    def _initialize_csv_file(self):
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self._last_timestamp = None
+        self._last_datetime_str = ""
+
+        self.price_index = None
+        if delta_only or changes_path:
+            self.price_index = PriceIndex.from_history(db_path, changes_path,
+                                                       archive_path)
+
+        # Один дескриптор на файл на весь запуск, запись в фоновом потоке
+        self.csv_writer = self._open_writer(self.db_path, self.fieldnames)
+        self.changes_writer = None
+        if changes_path:
+            self.changes_writer = self._open_writer(changes_path,
+                                                    CHANGES_FIELDNAMES)
+
+        self.columnar_sink = None
+        if columnar_path:
+            self.columnar_sink = ParquetSink(columnar_path)
+
+    def _open_writer(self, path, header):
         """
-        Инициализирует CSV-файл, создавая заголовки, если файл пустой или не существует
+        Открывает файл на дозапись, создавая заголовки, если файл пустой или не
+        существует
         """
-        try:
-            if not os.path.exists(self.db_path) or os.path.getsize(
-                    self.db_path) == 0:
-                with open(self.db_path, 'w', newline='',
-                          encoding='utf-8') as csvfile:
-
-                    writer = csv.DictWriter(csvfile,
-                                            fieldnames=self.fieldnames)
-                    writer.writeheader()
-
-        except Exception as e:
-            logger.error(f"Error initializing CSV file: {e}")
+        return BackgroundCSVWriter(path,
+                                   header,
+                                   flush_interval=self.flush_interval,
+                                   fsync_interval=self.fsync_interval)
 
     def create_products(self, products, categ_name):
         """
         Добавляет новые продукты в существующий CSV-файл
         
         Args:
-            products (List[Product]): Список продуктов для сохранения
+            products (Iterable[Product]): Продукты для сохранения
             categ_name (str): Название категории, откуда продукты
         """
         try:
-            data = []
+            rows = []
+            changes = []
+            saved = []
             for product in products:
-                product_data = {
-                    "shop": product.shop,
-                    'datetime': product.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                    'price_reg': max(product.prices),
-                    'price_promo': min(product.prices),
-                    'article': product.article,
-                    'name': product.name,
-                    'category_path': categ_name
-                }
-                data.append(product_data)
-
-            if not hasattr(self, 'fieldnames'):
-                self.fieldnames = [
-                    "shop", "datetime", "price_reg", 'price_promo', 'article',
-                    'name', 'category_path'
-                ]
-
-            with open(self.db_path, 'a', newline='',
-                      encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
-
-                if csvfile.tell() == 0:
-                    writer.writeheader()
-
-                writer.writerows(data)
-
-            return len(data)
+                if self.price_index is not None:
+                    changed, previous = self.price_index.update(product)
+                    if changed:
+                        changes.append(self._change_row(product, previous))
+                    elif self.delta_only:
+                        continue
+
+                # Отметки об отсутствии идут только в ленту изменений
+                if not product.in_stock:
+                    continue
+
+                rows.append(self._product_row(product, categ_name))
+                saved.append(product)
+
+            self.csv_writer.write_rows(rows)
+            if changes and self.changes_writer is not None:
+                self.changes_writer.write_rows(changes)
 
         except Exception as e:
             logger.error(f"Error creating products: {e}")
             return 0
 
+        # Колоночное хранилище необязательно: его ошибка не должна терять
+        # строки CSV, уже учтённые в индексе цен
+        if self.columnar_sink is not None:
+            try:
+                for product in saved:
+                    self.columnar_sink.append(product.timestamp,
+                                              product.price_reg,
+                                              product.price_promo,
+                                              product.article, product.name,
+                                              categ_name, product.shop)
+            except Exception as e:
+                logger.error(f"Ошибка записи в колоночное хранилище: {e}")
+
+        return len(rows)
+
+    def _product_row(self, product: Product, categ_name):
+        """
+        Строка CSV в порядке self.fieldnames. Время форматируется один раз на
+        секунду: продукты одной выгрузки почти всегда делят одну и ту же секунду
+        """
+        if product.timestamp != self._last_timestamp:
+            self._last_timestamp = product.timestamp
+            self._last_datetime_str = format_timestamp(product.timestamp)
+
+        return (product.shop, self._last_datetime_str,
+                format_kopecks(product.price_reg),
+                format_kopecks(product.price_promo), product.article,
+                product.name, categ_name)
+
+    def _change_row(self, product: Product, previous):
+        """
+        Строка ленты изменений. Для нового продукта старые значения пустые, для
+        отсутствующего - пустые новые цены
+        """
+        old_values = ("", "", "")
+        if previous is not None:
+            old_values = (format_kopecks(previous[0]),
+                          format_kopecks(previous[1]), int(previous[2]))
+
+        new_values = ("", "", 0)
+        if product.in_stock:
+            new_values = (format_kopecks(product.price_reg),
+                          format_kopecks(product.price_promo), 1)
+
+        return (product.shop, format_timestamp(product.timestamp),
+                product.article, product.name) + old_values + new_values
+
+    def close(self):
+        """
+        Сбрасывает буферы хранилищ, вызывается в конце работы
+        """
+        self.csv_writer.close()
+        if self.changes_writer is not None:
+            self.changes_writer.close()
+        if self.columnar_sink is not None:
+            self.columnar_sink.close()
+
     def get_products(self, limit=None):
+        self.csv_writer.flush()
         with open(self.db_path, 'r', newline='', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
 
@@ -86,20 +187,36 @@ class DBManager:
                 return list(islice(reader, limit))
 
     def delete_product(self, article_number):
+        """
+        Удаляет все строки артикула. Файл переписывается потоково во временный
+        рядом и подменяет исходный, в памяти держится одна строка
+        """
+        self.csv_writer.close()
+        tmp_path = ""
         try:
-            rows = self.get_products()
-            with open(self.db_path, 'w', newline='',
-                      encoding='utf-8') as csvfile:
-
-                writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
+            tmp_fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.db_path)),
+                suffix=".tmp")
+            with open(self.db_path, 'r', newline='', encoding='utf-8') as src, \
+                    os.fdopen(tmp_fd, 'w', newline='', encoding='utf-8') as dst:
+                reader = csv.DictReader(src)
+                writer = csv.DictWriter(dst, fieldnames=self.fieldnames)
                 writer.writeheader()
 
-                for row in rows:
-                    if row['Article Number'] != article_number:
+                for row in reader:
+                    if row['article'] != article_number:
                         writer.writerow(row)
 
+            os.replace(tmp_path, self.db_path)
+
         except Exception as e:
             logger.error(f"Error deleting product: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
 
+        finally:
+            # Прежний дескриптор указывал на заменённый файл
+            self.csv_writer = self._open_writer(self.db_path, self.fieldnames)
+
         return True
@@ -0,0 +1,232 @@
+import os
+import socket
+import threading
+import uuid
+from logging import Logger
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+
+from models import Product
+from distributed.task_queue import TASK_CATEGORY, TASK_LISTING, TASK_PRODUCT
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseHeartbeat(threading.Thread):
+    """
+    Фоновый поток, продлевающий аренду задач, которые воркер сейчас выполняет
+    """
+
+    def __init__(self, task_queue, worker_id: str, interval: float):
+        super().__init__(daemon=True)
+        self.task_queue = task_queue
+        self.worker_id = worker_id
+        self.interval = interval
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def add(self, task_id: int):
+        with self._lock:
+            self._in_flight.add(task_id)
+
+    def discard(self, task_id: int):
+        with self._lock:
+            self._in_flight.discard(task_id)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                task_ids = list(self._in_flight)
+            self.task_queue.heartbeat(task_ids, self.worker_id)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class Worker:
+    """
+    Узел-воркер: арендует задачи из общей очереди, выполняет их через
+    ParsingProcessor и пишет результаты обратно в очередь. Страницы списков
+    порождают задачи на продукты и на следующие страницы пагинации
+    """
+
+    def __init__(self,
+                 task_queue,
+                 parsing_processor,
+                 logger: Logger,
+                 worker_id: str = "",
+                 threads: int = 4,
+                 max_pages: int = 1000,
+                 poll_interval: float = 5.0,
+                 run_id: str = ""):
+        """
+        Args:
+            run_id (str): Запуск координатора, в котором участвует воркер. Если
+                в очереди начался другой запуск, воркер завершается
+        """
+        self.task_queue = task_queue
+        self.parsing_processor = parsing_processor
+        self.logger = logger
+        self.worker_id = worker_id or default_worker_id()
+        self.threads = threads
+        self.max_pages = max_pages
+        self.poll_interval = poll_interval
+        self.run_id = run_id or task_queue.get_meta("run_id", "")
+        self.heartbeat = LeaseHeartbeat(task_queue, self.worker_id,
+                                        task_queue.visibility_timeout / 3)
+
+    def run(self):
+        """
+        Работает, пока координатор не закончил постановку задач и в очереди
+        остаются невыполненные задачи
+        """
+        self.logger.info(f"Воркер {self.worker_id} запущен")
+        self.heartbeat.start()
+        processed = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                while True:
+                    tasks = self.task_queue.lease(self.worker_id, self.threads)
+                    if not tasks:
+                        if self.task_queue.get_meta("run_id") != self.run_id:
+                            self.logger.info(
+                                "В очереди начался новый запуск, воркер "
+                                f"{self.worker_id} завершается")
+                            break
+                        if (self.task_queue.get_meta("seeded", False)
+                                and self.task_queue.is_drained()):
+                            break
+                        sleep(self.poll_interval)
+                        continue
+
+                    for task in tasks:
+                        self.heartbeat.add(task.id)
+                    # Берём следующую пачку только после завершения текущей,
+                    # чтобы не держать в аренде больше задач, чем потоков
+                    processed += sum(executor.map(self.run_task, tasks))
+        finally:
+            self.heartbeat.stop()
+
+        self.logger.info(
+            f"Воркер {self.worker_id} завершил работу, задач выполнено: {processed}"
+        )
+
+    def run_task(self, task) -> bool:
+        try:
+            if task.kind == TASK_PRODUCT:
+                results, new_tasks = self._run_product(task), []
+            else:
+                results, new_tasks = [], self._run_listing(task)
+
+            return self.task_queue.complete(task, self.worker_id, results,
+                                            new_tasks)
+
+        except Exception as e:
+            self.logger.error(f"Ошибка при выполнении задачи {task}: {e}")
+            self.task_queue.fail(task, self.worker_id, str(e))
+            return False
+
+        finally:
+            self.heartbeat.discard(task.id)
+
+    def _run_product(self, task):
+        # Отметки об отсутствии (in_stock=False) передаются координатору для
+        # ленты изменений, если парсер настроен их выдавать
+        products = self.parsing_processor.process_product_link(task.url) or []
+        return [[
+            product.shop, product.name, product.article, product.price_reg,
+            product.price_promo, product.timestamp, product.in_stock
+        ] for product in products if product]
+
+    def _run_listing(self, task):
+        listing = self.parsing_processor.parse_listing_page(
+            task.url,
+            is_first_page=(task.kind == TASK_CATEGORY),
+            need_pagination=True)
+        if listing is None:
+            raise RuntimeError(f"Не удалось разобрать страницу {task.url}")
+
+        product_links, pagination_links = listing
+        new_tasks = [(TASK_PRODUCT, link, task.category)
+                     for link in product_links]
+
+        # Ограничение max_pages на категорию соблюдается приблизительно:
+        # несколько воркеров могут одновременно увидеть один и тот же счётчик
+        free_pages = self.max_pages - self.task_queue.count(
+            TASK_LISTING, task.category)
+        new_tasks.extend((TASK_LISTING, link, task.category)
+                         for link in pagination_links[:max(free_pages, 0)])
+
+        return new_tasks
+
+
+class Coordinator:
+    """
+    Узел-координатор: ставит в очередь стартовые страницы категорий и
+    сохраняет результаты воркеров через DBManager
+    """
+
+    def __init__(self,
+                 task_queue,
+                 db_manager,
+                 logger: Logger,
+                 poll_interval: float = 5.0,
+                 batch_size: int = 1000):
+        self.task_queue = task_queue
+        self.db_manager = db_manager
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+
+    def seed(self, base_url: str, cat_page_url: str, start_pages) -> str:
+        """
+        Начинает новый запуск: задачи и результаты прошлых запусков из очереди
+        удаляются, иначе совпадающие ссылки не попали бы в очередь снова
+
+        Args:
+            start_pages (Iterable[Tuple]): (kind, url, category) стартовых страниц
+
+        Returns:
+            str: Идентификатор запуска
+        """
+        run_id = uuid.uuid4().hex
+        self.task_queue.start_run(run_id, {
+            "base_url": base_url,
+            "cat_page_url": cat_page_url
+        })
+        added = self.task_queue.enqueue_many(start_pages)
+        self.task_queue.set_meta("seeded", True)
+        self.logger.info(
+            f"Запуск {run_id}: в очередь поставлено стартовых страниц: {added}")
+        return run_id
+
+    def collect(self) -> int:
+        """
+        Сохраняет результаты, пока очередь не опустеет
+
+        Returns:
+            int: Количество сохранённых продуктов
+        """
+        saved = 0
+        while True:
+            drained = self.task_queue.is_drained()
+            grouped = self.task_queue.drain_results(self.batch_size)
+            for category, rows in grouped.items():
+                saved += self.db_manager.create_products(
+                    (Product(*row[:6], in_stock=row[6]) for row in rows),
+                    category)
+
+            if drained and not grouped:
+                break
+            if not grouped:
+                self.logger.info(
+                    f"Состояние очереди: {self.task_queue.stats()}")
+                sleep(self.poll_interval)
+
+        # Воркеры, запущенные до следующего координатора, ждут новый запуск
+        self.task_queue.set_meta("finished", True)
+        self.logger.info(f"Координатор сохранил продуктов: {saved}")
+        return saved
@@ -0,0 +1,447 @@
+import json
+import sqlite3
+import threading
+from time import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Типы задач
+TASK_CATEGORY = "category"  # Первая страница категории: нужно найти ссылку "все товары"
+TASK_LISTING = "listing"  # Страница со списком продуктов
+TASK_PRODUCT = "product"  # Страница продукта (вместе с вариациями)
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+LEASE_EXPIRED_ERROR = "Аренда истекла после последней попытки"
+
+
+class Task:
+    __slots__ = ('id', 'kind', 'url', 'category', 'attempts')
+
+    def __init__(self, task_id, kind, url, category, attempts):
+        self.id = task_id
+        self.kind = kind
+        self.url = url
+        self.category = category
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.kind}, {self.url!r})"
+
+
+class SQLiteTaskQueue:
+    """
+    Общая очередь задач с арендой (lease) поверх SQLite.
+
+    Файл базы может лежать на общем томе, тогда с ним работают координатор и
+    все воркеры. Воркер берёт задачи в аренду на visibility_timeout секунд и
+    продлевает её heartbeat'ом. Если узел упал, его задачи просто снова
+    становятся доступны после истечения аренды - остальные задачи не
+    затрагиваются. Задачи с одинаковыми (kind, url) ставятся в очередь один раз
+    за запуск: файл хранится между запусками, и каждый новый запуск
+    координатора начинается с start_run, очищающего задачи прошлого
+    """
+
+    def __init__(self,
+                 db_path: str,
+                 visibility_timeout: float = 300,
+                 max_attempts: int = 5):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path,
+                                     timeout=60,
+                                     isolation_level=None,
+                                     check_same_thread=False)
+        self._initialize_db()
+
+    def _initialize_db(self):
+        with self._lock:
+            # WAL держит индекс в разделяемой памяти одного хоста и не
+            # работает на сетевом томе, общем для нескольких машин
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    category TEXT NOT NULL DEFAULT '',
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_until REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    UNIQUE (kind, url)
+                );
+                CREATE INDEX IF NOT EXISTS tasks_state
+                    ON tasks (state, lease_until);
+                CREATE TABLE IF NOT EXISTS results (
+                    id INTEGER PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    row TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+
+    def _transaction(self, callback):
+        """
+        Выполняет callback(conn) в транзакции BEGIN IMMEDIATE: запись
+        блокируется сразу, и два узла не смогут арендовать одну и ту же задачу
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = callback(self._conn)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def start_run(self, run_id: str, meta: Dict[str, object]):
+        """
+        Начинает новый запуск: атомарно удаляет задачи, результаты и
+        служебные записи прошлого запуска и записывает meta вместе с run_id
+        """
+
+        def reset(conn):
+            conn.execute("DELETE FROM tasks")
+            conn.execute("DELETE FROM results")
+            conn.execute("DELETE FROM meta")
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value))
+                 for key, value in dict(meta, run_id=run_id).items()])
+
+        self._transaction(reset)
+
+    def set_meta(self, key: str, value):
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))))
+
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?",
+                                     (key, )).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def enqueue_many(self, tasks: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Ставит задачи (kind, url, category) в очередь, пропуская уже известные
+
+        Returns:
+            int: Количество действительно добавленных задач
+        """
+        rows = list(tasks)
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (kind, url, category) VALUES (?, ?, ?)",
+                rows)
+            return conn.total_changes - before
+
+        return self._transaction(insert) if rows else 0
+
+    def enqueue(self, kind: str, url: str, category: str = "") -> bool:
+        return self.enqueue_many([(kind, url, category)]) == 1
+
+    def count(self, kind: str, category: Optional[str] = None) -> int:
+        query = "SELECT COUNT(*) FROM tasks WHERE kind = ?"
+        params = [kind]
+        if category is not None:
+            query += " AND category = ?"
+            params.append(category)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def lease(self, worker_id: str, limit: int = 1) -> List[Task]:
+        """
+        Арендует до limit задач: ожидающие и те, чья аренда истекла (узел,
+        который их держал, перестал слать heartbeat). Задача с истёкшей
+        арендой после max_attempts попыток помечается проваленной, иначе
+        задача, роняющая воркер, выдавалась бы бесконечно
+        """
+
+        def take(conn):
+            now = time()
+            conn.execute(
+                """UPDATE tasks SET state = ?, lease_until = 0, error = ?
+                   WHERE state = ? AND lease_until < ? AND attempts >= ?""",
+                (STATE_FAILED, LEASE_EXPIRED_ERROR, STATE_LEASED, now,
+                 self.max_attempts))
+            rows = conn.execute(
+                """SELECT id, kind, url, category, attempts FROM tasks
+                   WHERE state = ? OR (state = ? AND lease_until < ?)
+                   ORDER BY id LIMIT ?""",
+                (STATE_PENDING, STATE_LEASED, now, limit)).fetchall()
+            if rows:
+                conn.executemany(
+                    """UPDATE tasks SET state = ?, worker = ?, lease_until = ?,
+                       attempts = attempts + 1 WHERE id = ?""",
+                    [(STATE_LEASED, worker_id, now + self.visibility_timeout,
+                      row[0]) for row in rows])
+            return [
+                Task(task_id, kind, url, category, attempts + 1)
+                for task_id, kind, url, category, attempts in rows
+            ]
+
+        return self._transaction(take)
+
+    def heartbeat(self, task_ids: Iterable[int], worker_id: str) -> int:
+        """
+        Продлевает аренду задач, которые всё ещё принадлежат воркеру
+        """
+        ids = list(task_ids)
+        if not ids:
+            return 0
+
+        def extend(conn):
+            before = conn.total_changes
+            conn.executemany(
+                """UPDATE tasks SET lease_until = ?
+                   WHERE id = ? AND worker = ? AND state = ?""",
+                [(time() + self.visibility_timeout, task_id, worker_id,
+                  STATE_LEASED) for task_id in ids])
+            return conn.total_changes - before
+
+        return self._transaction(extend)
+
+    def complete(self,
+                 task: Task,
+                 worker_id: str,
+                 results: Iterable[list] = (),
+                 new_tasks: Iterable[Tuple[str, str, str]] = ()) -> bool:
+        """
+        Завершает задачу, атомарно записывая её результаты и порождённые задачи.
+        Если аренда уже перешла другому узлу, результат отбрасывается
+
+        Args:
+            results (Iterable[list]): Строки продуктов для координатора
+            new_tasks (Iterable[Tuple]): Новые задачи (kind, url, category)
+        """
+        result_rows = [(task.category, json.dumps(row, ensure_ascii=False))
+                       for row in results]
+        task_rows = list(new_tasks)
+
+        def finish(conn):
+            updated = conn.execute(
+                """UPDATE tasks SET state = ?, lease_until = 0
+                   WHERE id = ? AND worker = ? AND state = ?""",
+                (STATE_DONE, task.id, worker_id, STATE_LEASED)).rowcount
+            if not updated:
+                return False
+            conn.executemany(
+                "INSERT INTO results (category, row) VALUES (?, ?)",
+                result_rows)
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (kind, url, category) VALUES (?, ?, ?)",
+                task_rows)
+            return True
+
+        return self._transaction(finish)
+
+    def fail(self, task: Task, worker_id: str, error: str):
+        """
+        Возвращает задачу в очередь, либо помечает её проваленной после
+        max_attempts попыток
+        """
+        state = STATE_FAILED if task.attempts >= self.max_attempts else STATE_PENDING
+        self._transaction(lambda conn: conn.execute(
+            """UPDATE tasks SET state = ?, lease_until = 0, error = ?
+               WHERE id = ? AND worker = ?""",
+            (state, error, task.id, worker_id)))
+
+    def drain_results(self, limit: int = 1000) -> Dict[str, List[list]]:
+        """
+        Забирает накопленные результаты, сгруппированные по категории, и
+        удаляет их из очереди
+        """
+
+        def take(conn):
+            rows = conn.execute(
+                "SELECT id, category, row FROM results ORDER BY id LIMIT ?",
+                (limit, )).fetchall()
+            if rows:
+                conn.execute("DELETE FROM results WHERE id <= ?",
+                             (rows[-1][0], ))
+            return rows
+
+        grouped = {}
+        for _, category, row in self._transaction(take):
+            grouped.setdefault(category, []).append(json.loads(row))
+        return grouped
+
+    def is_drained(self) -> bool:
+        """Нет ни ожидающих, ни арендованных задач"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)",
+                (STATE_PENDING, STATE_LEASED)).fetchone()
+        return row[0] == 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LocalTaskQueue:
+    """
+    Очередь в памяти процесса с тем же интерфейсом, что и SQLiteTaskQueue.
+    Заменитель брокера для запуска координатора и воркеров-потоков в одном
+    процессе (отладка, одна машина без общего тома)
+    """
+
+    def __init__(self, visibility_timeout: float = 300, max_attempts: int = 5):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._tasks: Dict[int, list] = {}
+        self._keys = set()
+        self._results: List[Tuple[str, list]] = []
+        self._meta = {}
+        self._next_id = 1
+
+    def start_run(self, run_id: str, meta: Dict[str, object]):
+        with self._lock:
+            self._tasks.clear()
+            self._keys.clear()
+            self._results.clear()
+            self._meta = dict(meta, run_id=run_id)
+
+    def set_meta(self, key: str, value):
+        with self._lock:
+            self._meta[key] = value
+
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            return self._meta.get(key, default)
+
+    def _insert(self, kind, url, category) -> bool:
+        if (kind, url) in self._keys:
+            return False
+        self._keys.add((kind, url))
+        # [kind, url, category, state, worker, lease_until, attempts]
+        self._tasks[self._next_id] = [
+            kind, url, category, STATE_PENDING, None, 0, 0
+        ]
+        self._next_id += 1
+        return True
+
+    def enqueue_many(self, tasks: Iterable[Tuple[str, str, str]]) -> int:
+        with self._lock:
+            return sum(self._insert(*task) for task in tasks)
+
+    def enqueue(self, kind: str, url: str, category: str = "") -> bool:
+        return self.enqueue_many([(kind, url, category)]) == 1
+
+    def count(self, kind: str, category: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for task in self._tasks.values()
+                       if task[0] == kind and (category is None
+                                               or task[2] == category))
+
+    def lease(self, worker_id: str, limit: int = 1) -> List[Task]:
+        leased = []
+        with self._lock:
+            now = time()
+            for task_id, task in self._tasks.items():
+                if len(leased) >= limit:
+                    break
+                if (task[3] == STATE_LEASED and task[5] < now
+                        and task[6] >= self.max_attempts):
+                    task[3] = STATE_FAILED
+                    task[5] = 0
+                    continue
+                if task[3] == STATE_PENDING or (task[3] == STATE_LEASED
+                                                and task[5] < now):
+                    task[3] = STATE_LEASED
+                    task[4] = worker_id
+                    task[5] = now + self.visibility_timeout
+                    task[6] += 1
+                    leased.append(
+                        Task(task_id, task[0], task[1], task[2], task[6]))
+        return leased
+
+    def heartbeat(self, task_ids: Iterable[int], worker_id: str) -> int:
+        extended = 0
+        with self._lock:
+            for task_id in task_ids:
+                task = self._tasks.get(task_id)
+                if task and task[3] == STATE_LEASED and task[4] == worker_id:
+                    task[5] = time() + self.visibility_timeout
+                    extended += 1
+        return extended
+
+    def complete(self,
+                 task: Task,
+                 worker_id: str,
+                 results: Iterable[list] = (),
+                 new_tasks: Iterable[Tuple[str, str, str]] = ()) -> bool:
+        with self._lock:
+            stored = self._tasks.get(task.id)
+            if not stored or stored[3] != STATE_LEASED or stored[4] != worker_id:
+                return False
+            stored[3] = STATE_DONE
+            stored[5] = 0
+            self._results.extend((task.category, row) for row in results)
+            for new_task in new_tasks:
+                self._insert(*new_task)
+            return True
+
+    def fail(self, task: Task, worker_id: str, error: str):
+        with self._lock:
+            stored = self._tasks.get(task.id)
+            if stored and stored[4] == worker_id:
+                stored[3] = STATE_FAILED if task.attempts >= self.max_attempts else STATE_PENDING
+                stored[5] = 0
+
+    def drain_results(self, limit: int = 1000) -> Dict[str, List[list]]:
+        with self._lock:
+            taken = self._results[:limit]
+            del self._results[:limit]
+        grouped = {}
+        for category, row in taken:
+            grouped.setdefault(category, []).append(row)
+        return grouped
+
+    def is_drained(self) -> bool:
+        with self._lock:
+            return not any(task[3] in (STATE_PENDING, STATE_LEASED)
+                           for task in self._tasks.values())
+
+    def stats(self) -> Dict[str, int]:
+        stats = {}
+        with self._lock:
+            for task in self._tasks.values():
+                stats[task[3]] = stats.get(task[3], 0) + 1
+        return stats
+
+    def close(self):
+        pass
+
+
+def open_task_queue(backend: str = "sqlite",
+                    db_path: str = "crawl_queue.db",
+                    visibility_timeout: float = 300):
+    """
+    Создаёт очередь по названию бэкенда из конфигурации: sqlite или local
+    """
+    if backend == "sqlite":
+        return SQLiteTaskQueue(db_path, visibility_timeout)
+    if backend == "local":
+        return LocalTaskQueue(visibility_timeout)
+    raise ValueError(f"Неизвестный бэкенд очереди: {backend}")
@@ -1,145 +1,261 @@
+import argparse
 import json
-import traceback
 import logging
+import os
+import sys
+import traceback
+from time import perf_counter
+
+# Тяжёлые зависимости (selenium, bs4, requests, pyarrow) импортируются внутри
+# подкоманд, которым они нужны, поэтому query и export запускаются за
+# миллисекунды
 
-from db_manager import DBManager
-from models import Product
-from parsing.parsing_processor import ParsingProcessor
-from browser_emu.emulator import Emulator
+BASE_URL = "https://winestyle.ru/"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-# Настройка логирования
 logger = logging.getLogger('Parser')
-handler = logging.FileHandler('WineStyleParser.log', encoding="utf-8")
-handler.setFormatter(
-    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-logger.addHandler(handler)
-logger.setLevel(logging.INFO)
 
-emulator_logger = logging.getLogger('Emulator')
-emulator_handler = logging.FileHandler('BrowserEmulator.log', encoding="utf-8")
-emulator_handler.setFormatter(
-    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-emulator_logger.addHandler(emulator_handler)
-emulator_logger.setLevel(logging.INFO)
+# Подкоманда -> модули, которые импортирует её обработчик (в том числе
+# внутри функций, как pyarrow у export). Используется командой bench
+BENCH_MODULES = {
+    "cli": (),
+    "query": ("query", ),
+    "export": ("storage.columnar", "pyarrow", "pyarrow.dataset"),
+    "compact": ("storage.compaction", ),
+    "crawl": ("db_manager", "winestyle_parser"),
+    "crawl --role worker": ("winestyle_parser", ),
+    "resolve-store": ("browser_emu.emulator", ),
+}
 
 
-class WineStyleParser:
+def configure_logging(log_files=True):
     """
-    Класс для парсинга сайта WineStyle
+    Настраивает логи парсера. Для обхода - файлы WineStyleParser.log и
+    BrowserEmulator.log, для служебных команд - вывод в stderr
     """
+    if not log_files:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        return
 
-    def __init__(self, base_url: str, db_manager: DBManager,
-                 config_path) -> None:
-        """Инициализация парсера с настройками из конфигурационного файла и базой данных.
-
-        Args:
-            db_manager (DBManager): Объект DBManager
-            config_path (str): Путь к файлу конфигурации
-        """
-        self.base_url = base_url
-        self.cat_page_url = base_url
-        self.db_manager = db_manager
-        self.city = ""
-        self.address = ""
-        self.parse_categpries = False
-        self.max_threads = 1
-        self.page_threads = 1
-        self.max_categories = 1000
-        self.max_pages = 1000
-        self.config_path = config_path
-
-        self._load_config(config_path)
-        self.browser_emulator = Emulator(emulator_logger, config_path)
-
-        logger.info(f"Парсер инициализирован для города {self.city}")
-
-    def _load_config(self, config_path):
-        try:
-            with open(config_path, 'r', encoding='utf-8') as config_file:
-                res_json = json.load(config_file)
-
-            self.city = res_json.get('city', "")
-            self.address = res_json.get('address', "")
-            self.parse_categpries = res_json.get('parse_categories', False)
-            self.max_threads = res_json.get('threads', 1)
-            self.max_categories = res_json.get('max_categories', 1000)
-            self.max_pages = res_json.get('max_pages', 1000)
-            self.page_threads = res_json.get('page_threads', 1)
-
-            logger.info(f"Конфигурация загружена из {config_path}")
-
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке конфигурации: {e}")
-            raise
-
-    def get_products_from_category(self, categ_link, parse_categories):
-        """
-        Функция для получения продуктов из заданной категории. Праметр parse_categories отвечает за то, парсим мы категории (и соот-но нужно ли находить подкатегории), или передаётся конечная страница категории, на которой просто нужно взять все продукты (как, например, происходит при заданной ТТ)
-        
-        Args:
-            categ_link (str): Ссылка которую нужно распарсить
-            parse_categories (bool): Нужно ли парсить категори (также необходимо, если есьт подкатегории)
-
-        Returns:
-            List: Список продуктов, полученных по заданной категориии (и всем страницам)
-        """
-        products_list = self.parsing_processor.process_category_parallel(
-            categ_link=categ_link,
-            parse_categories=parse_categories,
-            page_threads=self.page_threads,
-            max_pages=self.max_pages)
-
-        return products_list
-
-    def save_products_csv(self, products_list, cat_name):
-        added_count = self.db_manager.create_products(products_list, cat_name)
-        logger.info(f"Добавлено продуктов: {added_count}")
-
-    def Parse(self):
-        logger.info("Начало парсинга")
-        base_url, cat_page_url = self.browser_emulator.start_emulation()
-        if not (base_url and cat_page_url):
-            logger.critical(
-                "Не удалось определить город и ТТ для парсинга, завершаю работу"
-            )
-            return
-
-        self.base_url, self.cat_page_url = base_url, cat_page_url
-        self.parsing_processor = ParsingProcessor(self.base_url,
-                                                  self.cat_page_url, logger,
-                                                  self.config_path)
-        if self.parse_categpries:
-            categories_links = self.parsing_processor.get_catalogue_categories(
-            )
-            logger.info(f"Найдены категории: {categories_links}")
-
-            categories_items = list(categories_links.items())
-            selected_categories = categories_items[
-                1:min(self.max_categories, len(categories_items)) +
-                1]  # Пропускаем секцию с акционными товарами и идём до кол-ва категорий указанных в конфиге. Если оно будет больше, то мы просто будем идти по всем найденным дабы не было ошибки
-            for category_name, categ_link in selected_categories:
-                products_list = self.get_products_from_category(
-                    categ_link, self.parse_categpries)
-                self.save_products_csv(products_list,
-                                       f"От Winestyle | {category_name}")
-
-        else:
-            products_list = self.get_products_from_category(
-                self.cat_page_url, self.parse_categpries)
-            self.save_products_csv(
-                products_list, f"От Winestyle | Из ТТ {self.address}| Все")
-
-
-def main():
+    for name, path in (('Parser', 'WineStyleParser.log'),
+                       ('Emulator', 'BrowserEmulator.log')):
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        named_logger = logging.getLogger(name)
+        named_logger.addHandler(handler)
+        named_logger.setLevel(logging.INFO)
+
+
+def _load_config(config_path):
+    with open(config_path, 'r', encoding='utf-8') as config_file:
+        return json.load(config_file)
+
+
+def _load_store(store_path):
+    if not store_path:
+        return None
+    with open(store_path, 'r', encoding='utf-8') as store_file:
+        store = json.load(store_file)
+    return store["base_url"], store["cat_page_url"]
+
+
+def run_crawl(args) -> int:
+    configure_logging()
     try:
-        base_url = "https://winestyle.ru/"
-        db_manager = DBManager("products.csv")
-        parser = WineStyleParser(base_url, db_manager, "config.json")
-        parser.Parse()
+        res_json = _load_config(args.config)
+        role = args.role or res_json.get('mode', "single")
+
+        if role == "worker":
+            from winestyle_parser import run_worker
+            run_worker(args.config)
+            return 0
+
+        from db_manager import DBManager
+        from winestyle_parser import WineStyleParser
+
+        db_manager = DBManager(args.csv,
+                               delta_only=res_json.get('delta_output', False),
+                               changes_path=res_json.get('changes_path', ""),
+                               columnar_path=res_json.get('columnar_path', ""),
+                               archive_path=res_json.get(
+                                   'archive_path', "archive"),
+                               flush_interval=res_json.get(
+                                   'csv_flush_interval', 5.0),
+                               fsync_interval=res_json.get(
+                                   'csv_fsync_interval', 30.0))
+        try:
+            parser = WineStyleParser(BASE_URL, db_manager, args.config)
+            store = _load_store(args.store)
+            if role == "coordinator":
+                from distributed.task_queue import open_task_queue
+
+                task_queue = open_task_queue(parser.queue_backend,
+                                             parser.queue_path,
+                                             parser.lease_timeout)
+                parser.Coordinate(task_queue, store)
+                task_queue.close()
+            else:
+                parser.Parse(store)
+        finally:
+            # Дописывает в файл всё, что ещё в очереди фоновой записи
+            db_manager.close()
+        return 0
     except Exception as e:
         logger.error(f"Критическая ошибка при работе парсера: {e}")
         logger.error(traceback.format_exc())
+        return 1
+
+
+def run_resolve_store(args) -> int:
+    configure_logging()
+    # Нужен только эмулятор: парсер с bs4 и requests не импортируется
+    from browser_emu.emulator import Emulator
+
+    emulator = Emulator(logging.getLogger('Emulator'), args.config)
+    base_url, cat_page_url = emulator.start_emulation()
+    if not (base_url and cat_page_url):
+        print("Не удалось определить город и ТТ", file=sys.stderr)
+        return 1
+
+    with open(args.output, 'w', encoding='utf-8') as store_file:
+        json.dump(
+            {
+                "city": emulator.city,
+                "address": emulator.address,
+                "base_url": base_url,
+                "cat_page_url": cat_page_url
+            },
+            store_file,
+            ensure_ascii=False,
+            indent=4)
+    print(f"{base_url}\n{cat_page_url}")
+    return 0
+
+
+def run_export(args) -> int:
+    configure_logging(log_files=False)
+    from storage.columnar import convert_csv_history
+
+    convert_csv_history(args.csv, args.output)
+    return 0
+
+
+def run_compact(args) -> int:
+    configure_logging(log_files=False)
+    from storage.compaction import compact_history
+
+    compact_history(args.csv, args.output, args.chunk_rows)
+    return 0
+
+
+def run_query(args) -> int:
+    import query
+
+    return query.run_query(args)
+
+
+def _measure_import(modules):
+    """
+    Импортирует main и модули подкоманды в отдельном процессе, чтобы не мешал
+    кэш sys.modules
+
+    Returns:
+        Tuple: (время импорта в мс, время запуска процесса в мс) или None,
+            если модуль не импортируется (например, не установлены зависимости)
+    """
+    import subprocess
+
+    imports = "; ".join(f"import {module}"
+                        for module in ("main", ) + tuple(modules))
+    code = ("from time import perf_counter; started = perf_counter(); "
+            f"{imports}; print((perf_counter() - started) * 1000)")
+    started = perf_counter()
+    # Модули проекта импортируются из его каталога, откуда бы ни запускали
+    completed = subprocess.run([sys.executable, "-c", code],
+                               capture_output=True,
+                               text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    total_ms = (perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        return None
+    return float(completed.stdout.strip()), total_ms
+
+
+def run_bench(args) -> int:
+    from statistics import median
+
+    print("команда\tмодули\tимпорт, мс\tзапуск процесса, мс")
+    for command, modules in BENCH_MODULES.items():
+        names = ", ".join(("main", ) + modules)
+        samples = [_measure_import(modules) for _ in range(args.repeat)]
+        if None in samples:
+            print(f"{command}\t{names}\tне импортируется\t-")
+            continue
+        import_ms = median(sample[0] for sample in samples)
+        total_ms = median(sample[1] for sample in samples)
+        print(f"{command}\t{names}\t{import_ms:.1f}\t{total_ms:.1f}")
+    return 0
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Парсер WineStyle")
+    commands = parser.add_subparsers(dest="command")
+
+    crawl = commands.add_parser("crawl", help="Обход сайта (по умолчанию)")
+    crawl.add_argument("--config", default="config.json")
+    crawl.add_argument("--csv", default="products.csv")
+    crawl.add_argument("--role",
+                       choices=["single", "coordinator", "worker"],
+                       help="По умолчанию - mode из конфига")
+    crawl.add_argument("--store",
+                       default="",
+                       help="Файл resolve-store: не запускать эмулятор")
+    crawl.set_defaults(handler=run_crawl)
+
+    resolve = commands.add_parser(
+        "resolve-store", help="Определить ссылки города и ТТ через эмулятор")
+    resolve.add_argument("--config", default="config.json")
+    resolve.add_argument("--output", default="store.json")
+    resolve.set_defaults(handler=run_resolve_store)
+
+    export = commands.add_parser("export",
+                                 help="Перенести историю CSV в Parquet")
+    export.add_argument("--csv", default="products.csv")
+    export.add_argument("--output", default="history")
+    export.set_defaults(handler=run_export)
+
+    compact = commands.add_parser(
+        "compact", help="Сжать историю CSV в файлы по датам без повторов")
+    compact.add_argument("--csv", default="products.csv")
+    compact.add_argument("--output", default="archive")
+    compact.add_argument("--chunk-rows", type=int, default=100_000)
+    compact.set_defaults(handler=run_compact)
+
+    query_parser = commands.add_parser("query",
+                                       help="Запросы к истории цен")
+    # query.py использует только стандартную библиотеку, его импорт дешёвый
+    from query import build_arg_parser as build_query_arg_parser
+    build_query_arg_parser(query_parser)
+    query_parser.set_defaults(handler=run_query)
+
+    bench = commands.add_parser(
+        "bench", help="Время импорта и запуска для каждой команды")
+    bench.add_argument("--repeat", type=int, default=5)
+    bench.set_defaults(handler=run_bench)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    if args.command is None:
+        # python main.py без подкоманды - обход, как раньше
+        args = build_arg_parser().parse_args(["crawl"])
+    return args.handler(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,11 +1,104 @@
-from typing import List
-from datetime import datetime
+from time import time, strftime, localtime, mktime, strptime
+from typing import Iterable
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def rub_to_kopecks(price) -> int:
+    """
+    Переводит цену в рублях (int, float или строка из CSV) в целые копейки
+    """
+    if isinstance(price, int):
+        return price * 100
+    return int(round(float(price) * 100))
+
+
+def format_kopecks(kopecks: int) -> str:
+    """
+    Форматирует цену в копейках в рубли так же, как она хранится в CSV:
+    целые рубли без дробной части, иначе с двумя знаками после точки
+    """
+    rub, kop = divmod(kopecks, 100)
+    if kop == 0:
+        return str(rub)
+    return f"{rub}.{kop:02d}"
+
+
+def format_timestamp(timestamp: int) -> str:
+    return strftime(DATETIME_FORMAT, localtime(timestamp))
+
+
+def parse_timestamp(value: str) -> int:
+    return int(mktime(strptime(value, DATETIME_FORMAT)))
 
 
 class Product:
-    shop: str
-    name: str
-    article: str
-    prices: List[str]
-    datetime: datetime
-    category_path: str
+    """
+    Компактная запись о продукте.
+
+    Цены хранятся в целых копейках, обычная и акционная цены вычисляются один
+    раз при создании, время - unix timestamp в секундах. Благодаря __slots__
+    у экземпляра нет собственного __dict__
+    """
+    __slots__ = ('shop', 'name', 'article', 'price_reg', 'price_promo',
+                 'timestamp', 'category_path', 'in_stock')
+
+    def __init__(self,
+                 shop: str,
+                 name: str,
+                 article: str,
+                 price_reg: int,
+                 price_promo: int,
+                 timestamp: int,
+                 category_path: str = "",
+                 in_stock: bool = True):
+        self.shop = shop
+        self.name = name
+        self.article = article
+        self.price_reg = price_reg
+        self.price_promo = price_promo
+        self.timestamp = timestamp
+        self.category_path = category_path
+        self.in_stock = in_stock
+
+    @classmethod
+    def from_prices(cls,
+                    shop: str,
+                    name: str,
+                    article: str,
+                    prices: Iterable[int],
+                    timestamp: int = None,
+                    category_path: str = ""):
+        """
+        Создаёт продукт из списка цен в рублях, как их возвращает парсер страницы
+
+        Args:
+            prices (Iterable[int]): Все найденные на странице цены в рублях
+            timestamp (int): Время получения, по умолчанию - текущее
+        """
+        kopecks = [rub_to_kopecks(price) for price in prices]
+        if timestamp is None:
+            timestamp = int(time())
+
+        return cls(shop, name, article, max(kopecks), min(kopecks), timestamp,
+                   category_path)
+
+    @classmethod
+    def out_of_stock(cls,
+                     shop: str,
+                     name: str,
+                     article: str,
+                     timestamp: int = None):
+        """
+        Отметка о том, что продукта нет в наличии. В products.csv такие записи
+        не попадают, они нужны только для отслеживания изменений наличия
+        """
+        if timestamp is None:
+            timestamp = int(time())
+
+        return cls(shop, name, article, 0, 0, timestamp, in_stock=False)
+
+    def __repr__(self):
+        return (f"Product(article={self.article!r}, shop={self.shop!r}, "
+                f"price_reg={self.price_reg}, price_promo={self.price_promo}, "
+                f"in_stock={self.in_stock})")
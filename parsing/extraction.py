@@ -0,0 +1,241 @@
+import json
+import os
+import re
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urljoin
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(__file__),
+                                 'extraction_spec.json')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class ExtractionSpecError(ValueError):
+    pass
+
+
+def _elementwise(function: Callable) -> Callable:
+    """
+    Шаг, применяемый к каждому элементу списка. None в результате означает
+    "нет значения" - такие элементы отбрасываются
+    """
+
+    def step(value, context):
+        if isinstance(value, list):
+            results = []
+            for item in value:
+                result = function(item, context)
+                if isinstance(result, list):
+                    results.extend(result)
+                elif result is not None:
+                    results.append(result)
+            return results
+        return function(value, context)
+
+    return step
+
+
+def _to_int(value, context):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _compile_step(step) -> Callable:
+    """
+    Превращает описание шага из спецификации в функцию (value, context).
+    Регулярные выражения компилируются здесь, один раз
+    """
+    if isinstance(step, str):
+        name, argument = step, None
+    elif isinstance(step, dict) and len(step) == 1:
+        name, argument = next(iter(step.items()))
+    else:
+        raise ExtractionSpecError(f"Некорректный шаг: {step}")
+
+    if name == "text":
+        return _elementwise(lambda el, ctx: el.get_text())
+    if name == "text_strip":
+        return _elementwise(lambda el, ctx: el.get_text(strip=True))
+    if name == "strip":
+        return _elementwise(lambda s, ctx: s.strip() or None)
+    if name == "lower":
+        return _elementwise(lambda s, ctx: s.lower())
+    if name == "remove_spaces":
+        return _elementwise(lambda s, ctx: _WHITESPACE_RE.sub('', s))
+    if name == "int":
+        return _elementwise(_to_int)
+    if name in ("select", "select_all"):
+        tag, cls = argument.get("tag"), argument.get("class")
+        # class_=None в bs4 означает "без атрибута class", поэтому фильтр по
+        # классу передаётся, только если он задан в спецификации
+        kwargs = {"class_": cls} if cls else {}
+        if name == "select":
+            return _elementwise(lambda el, ctx: el.find(tag, **kwargs))
+        return _elementwise(lambda el, ctx: list(el.find_all(tag, **kwargs)))
+    if name == "attr":
+        return _elementwise(lambda el, ctx: el.get(argument))
+    if name == "urljoin":
+        return _elementwise(lambda s, ctx: urljoin(ctx[argument], s))
+    if name == "after":
+        return _elementwise(lambda s, ctx: s.split(argument)[-1]
+                            if argument in s else None)
+    if name == "split":
+        return _elementwise(lambda s, ctx: s.split(argument))
+    if name == "regex":
+        pattern = re.compile(argument)
+
+        def search(s, ctx):
+            match = pattern.search(s)
+            return match.group() if match else None
+
+        return _elementwise(search)
+    if name == "greater_than":
+        return _elementwise(lambda x, ctx: x if x > argument else None)
+    if name == "contains":
+        return _elementwise(lambda s, ctx: argument in s)
+    if name == "first":
+        return lambda value, ctx: value[0] if value else None
+    if name == "index":
+        return lambda value, ctx: value[argument] if len(
+            value) > argument else None
+    if name == "unique_sorted":
+        return lambda value, ctx: sorted(set(value))
+
+    raise ExtractionSpecError(f"Неизвестный шаг: {name}")
+
+
+class _CompiledField:
+    __slots__ = ('container', 'steps', 'fallback')
+
+    def __init__(self, field_spec: dict):
+        self.container = field_spec["container"]
+        self.steps = [_compile_step(step) for step in field_spec["steps"]]
+        self.fallback = None
+        if "fallback" in field_spec:
+            self.fallback = _CompiledField(field_spec["fallback"])
+
+    def extract(self, containers: dict, context: dict):
+        value = containers.get(self.container)
+        for step in self.steps:
+            if value is None:
+                break
+            value = step(value, context)
+
+        if (value is None or value == []) and self.fallback is not None:
+            return self.fallback.extract(containers, context)
+        return value
+
+
+class PageExtractor:
+    """
+    Извлечение всех полей страницы одного типа за один обход дерева.
+
+    Обход документа находит все контейнеры из спецификации (первое вхождение,
+    либо все вхождения для "all": true) и останавливается, как только
+    найдено всё нужное. Дальнейшие шаги полей работают только внутри
+    небольших поддеревьев контейнеров
+    """
+
+    def __init__(self, page_spec: dict):
+        # имя тега -> [(имя контейнера, класс, собирать ли все, внутри чего)]
+        self._by_tag: Dict[str, list] = {}
+        self._single_count = 0
+        self._has_all = False
+        for name, selector in page_spec["containers"].items():
+            collect_all = selector.get("all", False)
+            self._by_tag.setdefault(selector["tag"], []).append(
+                (name, selector.get("class"), collect_all,
+                 selector.get("within")))
+            if collect_all:
+                self._has_all = True
+            else:
+                self._single_count += 1
+
+        self._fields = {
+            name: _CompiledField(field_spec)
+            for name, field_spec in page_spec["fields"].items()
+        }
+
+    def _find_containers(self, root) -> dict:
+        by_tag = self._by_tag
+        found = {}
+        remaining = self._single_count
+        for element in root.descendants:
+            name = element.name
+            if name is None:  # текстовый узел
+                continue
+            candidates = by_tag.get(name)
+            if not candidates:
+                continue
+
+            classes = element.get('class') or ()
+            for key, cls, collect_all, within in candidates:
+                if cls is not None and cls not in classes:
+                    continue
+                if within is not None and not self._is_inside(
+                        element, found.get(within)):
+                    continue
+                if collect_all:
+                    found.setdefault(key, []).append(element)
+                elif key not in found:
+                    found[key] = element
+                    remaining -= 1
+
+            if not remaining and not self._has_all:
+                break
+        return found
+
+    @staticmethod
+    def _is_inside(element, container) -> bool:
+        if container is None or isinstance(container, list):
+            return False
+        return any(parent is container for parent in element.parents)
+
+    def extract(self, root, context: Optional[dict] = None) -> dict:
+        """
+        Args:
+            root: BeautifulSoup или элемент, внутри которого ищутся поля
+            context (dict): Ссылки для шагов urljoin (base_url, page_url, ...)
+
+        Returns:
+            dict: Имя поля -> значение (None, если поле не найдено)
+        """
+        context = context or {}
+        containers = self._find_containers(root)
+        return {
+            name: field.extract(containers, context)
+            for name, field in self._fields.items()
+        }
+
+
+class ExtractionSpec:
+    """
+    Спецификация извлечения данных, скомпилированная при запуске: по
+    экстрактору на каждый тип страницы
+    """
+
+    def __init__(self, spec: dict):
+        try:
+            self.pages = {
+                page_type: PageExtractor(page_spec)
+                for page_type, page_spec in spec.items()
+            }
+        except (KeyError, TypeError, AttributeError, re.error) as e:
+            raise ExtractionSpecError(
+                f"Ошибка в спецификации извлечения: {e}") from e
+
+    @classmethod
+    def load(cls, path: str = ""):
+        with open(path or DEFAULT_SPEC_PATH, 'r',
+                  encoding='utf-8') as spec_file:
+            return cls(json.load(spec_file))
+
+    def extract(self, page_type: str, root, context: dict = None) -> dict:
+        return self.pages[page_type].extract(root, context)
+
+    def extract_many(self, page_type: str, roots: List,
+                     context: dict = None) -> List[dict]:
+        extractor = self.pages[page_type]
+        return [extractor.extract(root, context) for root in roots]
@@ -0,0 +1,160 @@
+import csv
+import math
+import sqlite3
+import threading
+from hashlib import blake2b
+from logging import Logger
+from typing import Iterable
+
+
+class BloomFilter:
+    """
+    Компактное вероятностное множество: "точно нет" или "возможно есть".
+    Для capacity элементов при error_rate = 0.01 занимает ~1.2 МБ на миллион
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) /
+                               (math.log(2)**2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> bool:
+        """
+        Добавляет ключ
+
+        Returns:
+            bool: Мог ли ключ уже быть в фильтре
+        """
+        maybe_present = True
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                maybe_present = False
+                self.bits[byte] |= 1 << bit
+        return maybe_present
+
+
+class ProductIdentityIndex:
+    """
+    Индекс продуктов на время одного запуска: по ссылке на страницу продукта и
+    по артикулу.
+
+    Каждая ссылка загружается один раз, каждый артикул записывается один раз,
+    а все категории, в которых встретился продукт, запоминаются и выгружаются
+    в конце запуска. В памяти держится только фильтр Блума, точное
+    подтверждение "возможно есть" делается по временной базе SQLite на диске
+    """
+
+    def __init__(self,
+                 logger: Logger,
+                 capacity: int = 1_000_000,
+                 error_rate: float = 0.01):
+        self.logger = logger
+        self.url_filter = BloomFilter(capacity, error_rate)
+        self.article_filter = BloomFilter(capacity, error_rate)
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        # Пустое имя - временная база SQLite на диске, удаляется при закрытии
+        self._conn = sqlite3.connect("", check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE urls (url TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE articles (article TEXT PRIMARY KEY) WITHOUT ROWID;
+            CREATE TABLE url_categories (
+                url TEXT NOT NULL,
+                category TEXT NOT NULL,
+                PRIMARY KEY (url, category)
+            ) WITHOUT ROWID;
+            CREATE TABLE url_articles (
+                url TEXT NOT NULL,
+                article TEXT NOT NULL,
+                PRIMARY KEY (url, article)
+            ) WITHOUT ROWID;
+            CREATE TABLE article_categories (
+                article TEXT NOT NULL,
+                category TEXT NOT NULL,
+                PRIMARY KEY (article, category)
+            ) WITHOUT ROWID;
+        """)
+
+    def _claim(self, bloom: BloomFilter, table: str, column: str,
+               key: str) -> bool:
+        if bloom.add(key):
+            # Фильтр мог ошибиться - проверяем точно
+            exists = self._conn.execute(
+                f"SELECT 1 FROM {table} WHERE {column} = ?",
+                (key, )).fetchone()
+            if exists:
+                self.duplicates += 1
+                return False
+        self._conn.execute(f"INSERT OR IGNORE INTO {table} VALUES (?)",
+                           (key, ))
+        return True
+
+    def claim_url(self, url: str, category: str = "") -> bool:
+        """
+        Returns:
+            bool: True, если ссылка встретилась впервые и её нужно загрузить
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO url_categories VALUES (?, ?)",
+                (url, category))
+            return self._claim(self.url_filter, "urls", "url", url)
+
+    def claim_article(self, article: str, category: str = "") -> bool:
+        """
+        Returns:
+            bool: True, если артикул встретился впервые и его нужно записать
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO article_categories VALUES (?, ?)",
+                (article, category))
+            return self._claim(self.article_filter, "articles", "article",
+                               article)
+
+    def record_products(self, url: str, articles: Iterable[str]):
+        """Запоминает артикулы, найденные на странице продукта"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO url_articles VALUES (?, ?)",
+                [(url, article) for article in articles])
+
+    def write_categories(self, path: str, shop: str) -> int:
+        """
+        Выгружает все пары (артикул, категория) за запуск: и найденные по
+        ссылке, и по артикулу
+
+        Returns:
+            int: Количество записанных строк
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT article, category FROM article_categories
+                UNION
+                SELECT ua.article, uc.category FROM url_categories AS uc
+                JOIN url_articles AS ua ON ua.url = uc.url
+                ORDER BY 1, 2""")
+            count = 0
+            with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(["shop", "article", "category_path"])
+                for article, category in rows:
+                    writer.writerow((shop, article, category))
+                    count += 1
+
+        self.logger.info(
+            f"Повторов продуктов пропущено: {self.duplicates}, "
+            f"записано пар артикул-категория: {count}")
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,19 +1,44 @@
-import re
 import json
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 from utils.network_utility import NetworkConnector
 from logging import Logger
-from typing import List
-from datetime import datetime
 from models import Product
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from parsing.extraction import ExtractionSpec
+from parsing.refresh import card_fingerprint
+from utils.memory_guard import MemoryGuard
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 
 class ParsingProcessor:
 
-    def __init__(self, base_url, cat_page_url, logger, config_path):
+    def __init__(self,
+                 base_url,
+                 cat_page_url,
+                 logger,
+                 config_path,
+                 scheduler=None,
+                 identity=None,
+                 stock_filter=None,
+                 fetch_queue=None,
+                 refresh=None):
+        """
+        Args:
+            scheduler (RecrawlScheduler): Планировщик повторного обхода. Если
+                задан, загружаются только отобранные им страницы продуктов
+            identity (ProductIdentityIndex): Индекс уже встреченных за запуск
+                продуктов. Если задан, каждый продукт загружается и
+                записывается один раз
+            stock_filter (StockFilter): Если задан, страницы продуктов и
+                вариаций, которых нет в наличии, не загружаются
+            fetch_queue (FetchQueue): Если задана, ссылки на продукты со
+                страниц списков только собираются, а загружаются затем в
+                drain_fetch_queue по приоритету
+            refresh (ConditionalRefresh): Если задан, страницы продуктов,
+                карточки которых в списке не изменились, не загружаются
+        """
         self.base_url = base_url
         self.cat_page_url = cat_page_url
         self.logger: Logger = logger
@@ -23,9 +48,38 @@ class ParsingProcessor:
         self.max_threads = 1
         self.page_threads = 1
         self.product_threads = 1
+        self.report_out_of_stock = False
+        self.rss_budget_mb = 0
+        self.rss_resume_fraction = 0.9
+        self.run_deadline_minutes = 0
+        self.fetch_time_reserve = 0.5
+        self.extraction_spec_path = ""
         self._load_config(config_path)
+        self.extraction_spec = ExtractionSpec.load(self.extraction_spec_path)
 
         self.network_connector = NetworkConnector(logger, config_path)
+        self.scheduler = scheduler
+        self.identity = identity
+        self.stock_filter = stock_filter
+        self.fetch_queue = fetch_queue
+        self.refresh = refresh
+        self.deadline = None
+        self.discovery_deadline = None
+        if self.run_deadline_minutes:
+            self.deadline = monotonic() + self.run_deadline_minutes * 60
+            self.discovery_deadline = self.deadline
+            if fetch_queue is not None:
+                # Продукты из очереди по приоритету загружаются только после
+                # сбора ссылок: часть времени запуска оставляется им
+                self.discovery_deadline = self.deadline - (
+                    self.run_deadline_minutes * 60 * self.fetch_time_reserve)
+        self.deadline_skipped = 0
+        self.memory_guard = None
+        if self.rss_budget_mb:
+            self.memory_guard = MemoryGuard(
+                self.rss_budget_mb,
+                logger,
+                resume_fraction=self.rss_resume_fraction)
 
     def _load_config(self, config_path):
         try:
@@ -37,12 +91,33 @@ class ParsingProcessor:
                 self.max_threads = res_json.get('threads', 1)
                 self.page_threads = res_json.get('page_threads', 1)
                 self.product_threads = res_json.get('product_threads', 1)
+                self.extraction_spec_path = res_json.get(
+                    'extraction_spec', "")
+                self.rss_budget_mb = res_json.get('rss_budget_mb', 0)
+                self.rss_resume_fraction = res_json.get(
+                    'rss_resume_fraction', 0.9)
+                self.run_deadline_minutes = res_json.get(
+                    'run_deadline_minutes', 0)
+                self.fetch_time_reserve = res_json.get(
+                    'priority_fetch_time_reserve', 0.5)
+                # Отметки об отсутствии нужны только для отслеживания изменений
+                self.report_out_of_stock = res_json.get(
+                    'delta_output', False) or bool(
+                        res_json.get('changes_path', ""))
 
         except Exception as e:
             self.logger.error(
                 f"Ошибка при загрузке конфигурации ParsingProcessor: {e}")
             raise
 
+    def deadline_passed(self) -> bool:
+        return self.deadline is not None and monotonic() >= self.deadline
+
+    def discovery_deadline_passed(self) -> bool:
+        """Пора прекращать сбор ссылок (страницы списков, sitemap)"""
+        return (self.discovery_deadline is not None
+                and monotonic() >= self.discovery_deadline)
+
     def get_catalogue_categories(self):
         categories_links = {}
         try:
@@ -72,79 +147,106 @@ class ParsingProcessor:
         response = self.network_connector.safe_request(categ_link)
         soup = BeautifulSoup(response.text, 'html.parser')
 
-        all_products_link = soup.find('a', class_='popular-category')
-
-        full_url = False
-        if all_products_link and 'href' in all_products_link.attrs:
-            full_url = urljoin(categ_link, all_products_link["href"])
+        fields = self.extraction_spec.extract('category_page', soup,
+                                              {'page_url': categ_link})
+        soup.decompose()
 
-        return full_url
+        return fields['all_products_link'] or False
 
-    def process_category(self,
-                         categ_link,
-                         is_first_page=True,
-                         is_last_page=False):
+    def parse_listing_page(self,
+                           categ_link,
+                           is_first_page=True,
+                           need_pagination=False):
         """
-        Обрабатывает категорию товаров.
-        
+        Разбирает страницу со списком продуктов, не загружая сами продукты.
+
         Args:
-            categ_link: ссылка на категорию
+            categ_link: ссылка на категорию или страницу списка
             is_first_page: флаг, указывающий является ли это первой страницей категории
-            is_last_page: флаг, указывающий является ли это последней известной страницей
-        """
-        self.logger.info(f"Обработка категории: {categ_link}")
+            need_pagination: нужно ли собирать ссылки на другие страницы
 
+        Returns:
+            Tuple: (ссылки на продукты, ссылки пагинации) или None при ошибке
+        """
         all_prod_link = categ_link
         if is_first_page:
             all_prod_link = self.get_all_products_in_category_link(categ_link)
             if not all_prod_link:
                 self.logger.error(
                     "Ошибка при получении контейнера со всеми продуктами!")
-                return [], []
+                return None
 
         response = self.network_connector.safe_request(all_prod_link,
                                                        method="get")
         soup = BeautifulSoup(response.text, 'html.parser')
 
-        # Обработка продуктов на текущей странице
-        result_products_list = []
-        all_products_container = soup.find('div', class_='ws-products__list')
-        if all_products_container:
-            all_products_list = all_products_container.find_all(
-                "div", class_="m-catalog-item--grid")
-            if not all_products_list:
-                all_products_list = all_products_container.find_all(
-                    "div", class_="m-catalog-item--list")
-
-            with ThreadPoolExecutor(
-                    max_workers=self.product_threads) as executor:
-                future_to_product = {}
-                for product in all_products_list:
-                    future = executor.submit(self.process_product, product)
-                    future_to_product[future] = product
-
-                for future in as_completed(future_to_product):
-                    product = future_to_product[future]
-                    try:
-                        prod_res = future.result()
-                        if prod_res:
-                            for result in prod_res:
-                                if result:
-                                    result_products_list.append(result)
-                    except Exception as e:
-                        self.logger.error(
-                            f"Ошибка при обработке продукта: {e}")
+        context = {'base_url': self.base_url, 'page_url': all_prod_link}
+        fields = self.extraction_spec.extract('listing_page', soup, context)
+
+        product_links = []
+        for card in self.extraction_spec.extract_many('listing_card',
+                                                      fields['cards'] or [],
+                                                      context):
+            if card['link']:
+                product_links.append(card['link'])
+                if self.fetch_queue is not None:
+                    self.fetch_queue.note_card(card['link'],
+                                               bool(card['promo']))
+                if self.refresh is not None:
+                    self.refresh.note_card(
+                        card['link'],
+                        card_fingerprint(card['price_text'], card['promo'],
+                                         card['out_of_stock']))
+            else:
+                self.logger.error(
+                    "Произошла ошибка при получении ссылки на продукт!")
 
         # Получаем ссылки на другие страницы если это первая страница или последняя известная
         new_pagination_links = []
-        if is_first_page or is_last_page:
-            pagination_pages = soup.find('div', class_='ws-pagination__pages')
-            if pagination_pages:
-                pag_hrefs = pagination_pages.find_all("a")
-                for pag in pag_hrefs:
-                    num = pag.get_text()
-                    link = all_prod_link.split('?')[0] + f"?page={num}"
-                    new_pagination_links.append(link)
+        if is_first_page or need_pagination:
+            for num in fields['pages'] or []:
+                link = all_prod_link.split('?')[0] + f"?page={num}"
+                new_pagination_links.append(link)
+
+        # Дерево страницы больше не нужно: освобождаем его сразу, не дожидаясь
+        # сборщика циклических ссылок и загрузки продуктов этой страницы
+        soup.decompose()
+
+        return product_links, new_pagination_links
+
+    def process_category(self,
+                         categ_link,
+                         is_first_page=True,
+                         is_last_page=False,
+                         category=""):
+        """
+        Обрабатывает категорию товаров.
+        
+        Args:
+            categ_link: ссылка на категорию
+            is_first_page: флаг, указывающий является ли это первой страницей категории
+            is_last_page: флаг, указывающий является ли это последней известной страницей
+            category: название категории для индекса продуктов
+        """
+        self.logger.info(f"Обработка категории: {categ_link}")
+        if self.discovery_deadline_passed():
+            self.logger.warning(
+                f"Время на сбор ссылок истекло, страница пропущена: {categ_link}")
+            return [], []
+        if self.memory_guard is not None:
+            self.memory_guard.wait()
+
+        listing = self.parse_listing_page(categ_link, is_first_page,
+                                          is_last_page)
+        if listing is None:
+            return [], []
+
+        product_links, new_pagination_links = listing
+        for product_link in product_links:
+            self.logger.info(f"Ссылка на продукт: {product_link}")
+
+        result_products_list = self.process_product_links(
+            product_links, category)
 
         return result_products_list, new_pagination_links
 
@@ -152,7 +254,9 @@ class ParsingProcessor:
                                   categ_link,
                                   parse_categories: bool,
                                   page_threads=4,
-                                  max_pages=10):
+                                  max_pages=10,
+                                  on_results=None,
+                                  category=""):
         """
         Параллельная обработка всех страниц категории и продуктов.
     
@@ -161,13 +265,25 @@ class ParsingProcessor:
             parse_categories (bool): Нужно ли парсить категори (также необходимо, если есть подкатегории)
             page_threads: количество потоков для обработки страниц
             max_pages: максимальное количество страниц для обработки
+            on_results: если задан, продукты каждой страницы сразу передаются
+                в него, а не копятся до конца категории
+            category: название категории для индекса продуктов
         """
         need_to_get_pagination = not parse_categories
         first_page_results, pagination_links = self.process_category(
             categ_link,
             is_first_page=parse_categories,
-            is_last_page=need_to_get_pagination)
-        all_results = first_page_results
+            is_last_page=need_to_get_pagination,
+            category=category)
+        all_results = []
+
+        def collect(page_results):
+            if on_results is not None:
+                on_results(page_results)
+            else:
+                all_results.extend(page_results)
+
+        collect(first_page_results)
         processed_links = {categ_link}
 
         page_count = 1
@@ -187,7 +303,8 @@ class ParsingProcessor:
                     is_really_first_page = False
                     is_last = (link == last_link)
                     future = executor.submit(self.process_category, link,
-                                             is_really_first_page, is_last)
+                                             is_really_first_page, is_last,
+                                             category)
                     future_to_url[future] = link
 
                 new_pagination_links = set()
@@ -195,7 +312,7 @@ class ParsingProcessor:
                     url = future_to_url[future]
                     try:
                         page_results, page_pagination = future.result()
-                        all_results.extend(page_results)
+                        collect(page_results)
                         if url == last_link:
                             new_pagination_links.update(page_pagination)
                         processed_links.add(url)
@@ -220,178 +337,260 @@ class ParsingProcessor:
 
         return all_results
 
-    def get_product_link(self, product):
-        name_container = product.find("div", "m-catalog-item__info")
-        product_link = name_container.find("a")
-
-        full_url = False
-        if product_link and 'href' in product_link.attrs:
-            full_url = urljoin(self.base_url, product_link["href"])
-
-        return full_url
-
-    def get_product_name(self, product_page):
-        try:
-            name_container = product_page.find(
-                'div', class_='o-productpage-info__title')
-            name_h = name_container.find("h1", "heading heading--3xl")
-
-            product_name = name_h.get_text()
-            self.logger.info(f"Название продукта: {product_name}")
-
-            return product_name
-        except Exception as e:
-            self.logger.warning(f"Не удаётся получить имя продукта!! {e}")
-            return False
-
-    def get_product_article(self, product_page):
-        try:
-            article_container = product_page.find(
-                'div', class_='o-productpage-info__controls')
-            article_spans = article_container.find_all("span")
-
-            self.logger.info(f"Артикли {article_spans}")
-
-            article = article_spans[2]
-            for span in article_spans:
-                span_text = span.get_text(strip=True)
-                if "Артикул:" in span_text:
-                    article = span_text.split("Артикул:")[-1].strip()
-                    break
+    def process_product_link(self, product_link):
+        """
+        Обрабатывает страницу продукта по ссылке вместе со всеми его вариациями
 
-            self.logger.info(f"Артикул продукта: {article}")
+        Returns:
+            List: Продукты, False для неудачных вариаций и None для
+                пропущенных без загрузки. Если в списке только продукты,
+                страница обработана полностью
+        """
+        fields = self.fetch_product_fields(product_link)
+        var_links = fields['variations']
 
-            return article
+        processed_products = []
+        if var_links:
+            self.logger.info(f"Массив с вариациями: {var_links}")
+            if self.stock_filter is not None:
+                unavailable = set(fields['unavailable_variations'] or [])
+                selected = self.stock_filter.filter(
+                    var_links,
+                    {link: link in unavailable
+                     for link in var_links})
+                # Незагруженные вариации: страница без них неполная
+                processed_products.extend(
+                    None for _ in range(len(var_links) - len(selected)))
+                var_links = selected
+            for link in var_links:
+                processed_product = self.process_exact_product(link)
+                processed_products.append(processed_product)
+        else:
+            self.logger.error(
+                f"Кажется у продукта нет вариаций {product_link}")
+            # Страница без вариаций - сама продукт, её поля уже извлечены
+            processed_products.append(
+                self.build_product(product_link, fields))
 
-        except Exception as e:
-            self.logger.warning(f"Не удаётся получить артикли продукта!! {e}")
-            return False
+        return processed_products
 
-    def get_product_price(self, product_page):
-        try:
-            price_container = product_page.find('div',
-                                                class_='m-productpage-price')
+    def process_product_links(self, product_links, category=""):
+        """
+        Параллельная обработка готовых ссылок на продукты (например, из sitemap)
 
-            prices_str = price_container.get_text()
+        Args:
+            product_links (Iterable[str]): Ссылки на страницы продуктов
+            category (str): Название категории для индекса продуктов
 
-            price_parts = [
-                part.strip() for part in prices_str.split('₽') if part.strip()
+        Returns:
+            List: Список полученных продуктов
+        """
+        if self.identity is not None:
+            product_links = [
+                link for link in product_links
+                if self.identity.claim_url(link, category)
             ]
 
-            prices = []
-            for part in price_parts:
-                match = re.search(r'\d+(?:\s+\d+)*', part)
-                if match is None:
-                    # self.logger.error(f"Не найдены числа в строке: '{part}'")
-                    continue
-
-                clean_price = re.sub(r'\s+', '', match.group())
+        # Продукты страниц с неизменившимися карточками выдаются из сохранённых
+        result_products_list = []
+        if self.refresh is not None:
+            product_links, reused = self.refresh.split(list(product_links))
+            for link, products in reused.items():
+                result_products_list.extend(
+                    self._accept_reused(link, products, category))
+
+        if self.fetch_queue is not None:
+            # Планировщик решает при выдаче из очереди, чтобы бюджет запросов
+            # тратился в порядке приоритета
+            self.fetch_queue.push_many(list(product_links), category)
+            return result_products_list
+
+        if self.scheduler is not None:
+            product_links = self.scheduler.select(list(product_links))
+
+        with ThreadPoolExecutor(max_workers=self.product_threads) as executor:
+            future_to_link = {
+                executor.submit(self._process_product_link_guarded, link):
+                link
+                for link in product_links
+            }
+
+            for future in as_completed(future_to_link):
+                link = future_to_link[future]
                 try:
-                    price = int(clean_price)
-                    if price > 100:
-                        prices.append(price)
-
-                except ValueError as e:
-                    self.logger.warning(
-                        f"Не удалось преобразовать строку '{clean_price}' в число: {e}"
-                    )
-                    continue
+                    result_products_list.extend(
+                        self._accept_results(link, future.result(), category))
+                except Exception as e:
+                    self.logger.error(
+                        f"Ошибка при обработке продукта {link}: {e}")
 
-            # Убираем дубликаты и сортируем цены
-            prices = sorted(list(set(prices)))
-            self.logger.info(f"Цены продукта: {prices}")
+        return result_products_list
 
-            return prices
-        except Exception as e:
-            self.logger.warning(f"Не удаётся получить цены продукта!! {e}")
-            return False
+    def drain_fetch_queue(self, on_results, batch_size=200):
+        """
+        Загружает собранные в fetch_queue ссылки строго по убыванию приоритета:
+        одновременно выполняется не больше product_threads загрузок, а
+        следующая ссылка берётся из очереди, только когда освободился поток.
+        После истечения времени запуска новые загрузки не начинаются. Если
+        задан планировщик, он отбирает ссылки и списывает бюджет запросов по
+        мере выдачи из очереди
 
-    def get_product_variations(self, product_link: str, product_page):
-        try:
-            variatons_container = product_page.find(
-                "div", class_="o-productpage-info__volume")
-            if not variatons_container:
-                self.logger.error(
-                    f"Кажется у продукта нет вариаций {product_link}")
-                return False
+        Args:
+            on_results: Вызывается с (продукты, категория) пачками по
+                batch_size продуктов одной категории
+        """
+        pending = {}
+
+        def save(category, force=False):
+            products = pending.get(category, [])
+            if products and (force or len(products) >= batch_size):
+                on_results(products, category)
+                pending[category] = []
+
+        with ThreadPoolExecutor(max_workers=self.product_threads) as executor:
+            in_flight = {}
+            while True:
+                while len(in_flight) < self.product_threads:
+                    if self.deadline_passed():
+                        break
+                    item = self.fetch_queue.pop(
+                        self.scheduler.admit
+                        if self.scheduler is not None else None)
+                    if item is None:
+                        break
+                    link, category = item
+                    future = executor.submit(self._process_product_link_guarded,
+                                             link)
+                    in_flight[future] = (link, category)
 
-            variatons_href = variatons_container.find_all("a")
+                if not in_flight:
+                    break
 
-            link = self.base_url + "/products"
-            var_links = []
-            for var in variatons_href:
-                if var and 'href' in var.attrs:
-                    full_url = urljoin(link, var["href"])
-                    var_links.append(full_url)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    link, category = in_flight.pop(future)
+                    try:
+                        prod_res = future.result()
+                        if prod_res and self.scheduler is None:
+                            self.fetch_queue.record(link, prod_res)
+                        pending.setdefault(category, []).extend(
+                            self._accept_results(link, prod_res, category))
+                        save(category)
+                    except Exception as e:
+                        self.logger.error(
+                            f"Ошибка при обработке продукта {link}: {e}")
 
-            self.logger.info(f"Массив с вариациями: {var_links}")
-            return var_links
+        for category in pending:
+            save(category, force=True)
 
-        except Exception as e:
+        if len(self.fetch_queue):
             self.logger.warning(
-                f"Не удаётся получить ссылки на вариации продукта!! {e}")
-            return False
+                f"Время запуска истекло, не загружено страниц продуктов: "
+                f"{len(self.fetch_queue)}")
+        self.fetch_queue.log_summary()
 
-    def process_product(self, product):
-        product_link = self.get_product_link(product)
+    def _accept_results(self, link, prod_res, category):
+        """
+        Учитывает результат страницы продукта в планировщике и индексе
+        продуктов
 
-        self.logger.info(f"Ссылка на продукт: {product_link}")
+        Returns:
+            List: Продукты, которые нужно сохранить
+        """
+        if not prod_res:
+            return []
+
+        # До отбора неудачных вариаций: по ним видно, полная ли страница и
+        # сколько было запросов
+        if self.refresh is not None:
+            self.refresh.record(link, prod_res)
+        if self.scheduler is not None:
+            self.scheduler.record(link, prod_res)
+        prod_res = [result for result in prod_res if result]
+        if self.identity is not None:
+            self.identity.record_products(
+                link, [result.article for result in prod_res])
+            # Та же вариация могла попасться по другой ссылке
+            prod_res = [
+                result for result in prod_res
+                if self.identity.claim_article(result.article, category)
+            ]
+        return prod_res
 
-        if not product_link:
-            self.logger.error(
-                "Произошла ошибка при получении ссылки на продукт!")
-            return False
+    def _accept_reused(self, link, products, category):
+        """
+        Повторно выданные продукты тоже попадают в индекс продуктов и не
+        должны дублироваться
+        """
+        if self.identity is None:
+            return products
+        self.identity.record_products(
+            link, [product.article for product in products])
+        return [
+            product for product in products
+            if self.identity.claim_article(product.article, category)
+        ]
+
+    def _process_product_link_guarded(self, product_link):
+        if self.deadline_passed():
+            # Уже поставленные в пул задачи не загружаются после дедлайна
+            self.deadline_skipped += 1
+            return []
+
+        if self.memory_guard is None:
+            return self.process_product_link(product_link)
+
+        self.memory_guard.acquire()
+        try:
+            return self.process_product_link(product_link)
+        finally:
+            self.memory_guard.release()
 
-        response = self.network_connector.safe_request(product_link)
+    def fetch_product_fields(self, link):
+        """
+        Загружает страницу продукта и за один обход извлекает все поля из
+        спецификации: название, артикул, цены, наличие, вариации
+        """
+        response = self.network_connector.safe_request(link)
         soup = BeautifulSoup(response.text, 'html.parser')
+        fields = self.extraction_spec.extract(
+            'product_page', soup, {
+                'base_url': self.base_url,
+                'page_url': link,
+                'products_url': self.base_url + "/products"
+            })
+        soup.decompose()
 
-        processed_products = []
-        var_links = self.get_product_variations(product_link, soup)
-        if var_links:
-            for link in var_links:
-                processed_product = self.process_exact_product(link)
-                processed_products.append(processed_product)
-        else:
-            processed_product = self.process_exact_product(product_link)
-            processed_products.append(processed_product)
+        return fields
 
-        return processed_products
+    def process_exact_product(self, link):
+        return self.build_product(link, self.fetch_product_fields(link))
 
-    def check_product_exists(self, link, product_page):
-        exists_span = product_page.find("span", "m-productpage-price__status")
-        exists_str: str = exists_span.get_text()
-        exists_str = exists_str.lower()
-        if "нет" in exists_str:
-            self.logger.error(f"Продукта нет в наличии {link}")
-            return False
+    def build_product(self, link, fields):
+        pr_name = fields['name']
+        pr_article = fields['article']
+        pr_prices = fields['prices']
+        self.logger.info(f"Название продукта: {pr_name}")
+        self.logger.info(f"Артикул продукта: {pr_article}")
+        self.logger.info(f"Цены продукта: {pr_prices}")
 
-        return True
+        if self.stock_filter is not None and fields['out_of_stock'] is not None:
+            self.stock_filter.record(link, not fields['out_of_stock'])
 
-    def process_exact_product(self, link):
-        response = self.network_connector.safe_request(link)
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        prod_exists = self.check_product_exists(link, soup)
-        if not prod_exists:
-            return False
+        if fields['out_of_stock']:
+            self.logger.error(f"Продукта нет в наличии {link}")
+            if not (self.report_out_of_stock and pr_name and pr_article):
+                return False
+            return Product.out_of_stock(self.address, pr_name, pr_article)
 
-        res_product = Product()
-        pr_name = self.get_product_name(soup)
-        pr_article = self.get_product_article(soup)
-        pr_prices = self.get_product_price(soup)
-        if pr_name and pr_article and pr_prices:
-            res_product.name = pr_name
-            res_product.article = pr_article
-            res_product.prices = pr_prices
-        else:
+        if not (pr_name and pr_article and pr_prices):
             self.logger.warning("Не удалось получить все данные продукта!")
             return False
 
-        self.logger.info(
-            f"\n{res_product.name} \n {res_product.article}\n{res_product.prices}"
-        )
+        res_product = Product.from_prices(self.address, pr_name, pr_article,
+                                          pr_prices)
 
-        res_product.datetime = datetime.now()
-        res_product.shop = self.address
+        self.logger.info(
+            f"\n{res_product.name} \n {res_product.article}\n{pr_prices}")
 
         return res_product
@@ -0,0 +1,143 @@
+import heapq
+import threading
+from logging import Logger
+from time import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from parsing.scheduler import DAY
+from storage.crawl_state import CrawlState
+
+
+def load_watchlist(path: str) -> List[str]:
+    """Артикулы из файла, по одному на строку"""
+    if not path:
+        return []
+    with open(path, 'r', encoding='utf-8') as watchlist_file:
+        return [line.strip() for line in watchlist_file if line.strip()]
+
+
+class FetchQueue:
+    """
+    Очередь загрузки страниц продуктов по приоритету.
+
+    Ссылки со всех страниц списков сначала собираются сюда, а затем
+    загружаются в порядке убывания приоритета. Если запуск прерывается по
+    времени или бюджету, успевают обновиться самые ценные продукты.
+
+    Приоритет - сумма слагаемых:
+        - вес категории (по вхождению имени из category_weights в название
+          категории, берётся наибольший)
+        - promo_priority, если на карточке в списке есть отметка акции
+        - staleness_priority за каждый день с последней загрузки страницы,
+          не больше max_staleness_days; новая страница считается самой
+          устаревшей
+        - watchlist_priority, если на странице есть артикул из списка
+          отслеживаемых
+    """
+
+    def __init__(self,
+                 crawl_state: CrawlState,
+                 shop: str,
+                 logger: Logger,
+                 category_weights: Optional[Dict[str, float]] = None,
+                 promo_priority: float = 1.0,
+                 staleness_priority: float = 0.1,
+                 max_staleness_days: float = 30,
+                 watchlist: Iterable[str] = (),
+                 watchlist_priority: float = 10.0):
+        self.crawl_state = crawl_state
+        self.shop = shop
+        self.logger = logger
+        self.category_weights = category_weights or {}
+        self.promo_priority = promo_priority
+        self.staleness_priority = staleness_priority
+        self.max_staleness_days = max_staleness_days
+        self.watchlist = set(watchlist)
+        self.watchlist_priority = watchlist_priority
+        self.fetched = 0
+
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._counter = 0
+        self._promo_urls = set()
+        self._lock = threading.Lock()
+
+    def note_card(self, url: str, promo: bool):
+        """Запоминает признаки карточки из списка продуктов"""
+        if promo:
+            with self._lock:
+                self._promo_urls.add(url)
+
+    def category_weight(self, category: str) -> float:
+        return max((weight for name, weight in self.category_weights.items()
+                    if name in category),
+                   default=0.0)
+
+    def score(self, url: str, category: str, pages: List[Tuple[str, int]],
+              now: float) -> float:
+        """
+        Args:
+            pages: [(артикул, время последней загрузки)] для страницы из
+                CrawlState, пустой список - страница ещё не загружалась
+        """
+        score = self.category_weight(category)
+        if url in self._promo_urls:
+            score += self.promo_priority
+
+        stale_days = self.max_staleness_days
+        if pages:
+            last_crawled = min(crawled for _, crawled in pages)
+            stale_days = min(stale_days, (now - last_crawled) / DAY)
+        score += self.staleness_priority * stale_days
+
+        if any(article in self.watchlist for article, _ in pages):
+            score += self.watchlist_priority
+        return score
+
+    def push_many(self, urls: List[str], category: str = ""):
+        known = self.crawl_state.get_pages(urls, self.shop)
+        now = time()
+        with self._lock:
+            for url in urls:
+                score = self.score(url, category, known.get(url, []), now)
+                heapq.heappush(self._heap,
+                               (-score, self._counter, url, category))
+                self._counter += 1
+
+    def pop(self,
+            admit: Optional[Callable[[str], bool]] = None
+            ) -> Optional[Tuple[str, str]]:
+        """
+        Args:
+            admit: Если задан, ссылки, для которых он вернул False (например,
+                закончился бюджет запросов), снимаются с очереди без загрузки
+
+        Returns:
+            Tuple: (ссылка, категория) с наибольшим приоритетом или None
+        """
+        while True:
+            with self._lock:
+                if not self._heap:
+                    return None
+                _, _, url, category = heapq.heappop(self._heap)
+                self._promo_urls.discard(url)
+
+            if admit is None or admit(url):
+                with self._lock:
+                    self.fetched += 1
+                return url, category
+
+    def __len__(self):
+        return len(self._heap)
+
+    def record(self, url: str, products):
+        """
+        Запоминает загрузку страницы, чтобы в следующих запусках знать её
+        устаревание и артикулы
+        """
+        articles = [product.article for product in products if product]
+        self.crawl_state.record_crawl(url, self.shop, articles, int(time()))
+
+    def log_summary(self):
+        self.logger.info(
+            f"Очередь по приоритету: загружено страниц {self.fetched}, "
+            f"не успели загрузить {len(self)}")
@@ -0,0 +1,122 @@
+import threading
+from hashlib import blake2b
+from logging import Logger
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+from models import Product
+from parsing.scheduler import DAY
+from storage.crawl_state import CrawlState
+
+
+def card_fingerprint(price_text, promo, out_of_stock) -> Optional[str]:
+    """
+    Отпечаток карточки продукта в списке: видимая цена, отметка акции и
+    наличия. None - на карточке не нашлось цены, сравнивать нечего
+    """
+    if not price_text:
+        return None
+    key = f"{price_text}|{bool(promo)}|{bool(out_of_stock)}"
+    return blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class ConditionalRefresh:
+    """
+    Условное обновление по отпечаткам карточек из списков продуктов.
+
+    Для каждой загруженной страницы продукта в CrawlState хранится отпечаток
+    её карточки и найденные на ней продукты (со всеми вариациями). Если в
+    следующем запуске отпечаток карточки тот же, страница и её вариации не
+    загружаются, а сохранённые продукты выдаются заново со свежим временем.
+    Не реже раза в max_age секунд страница загружается в любом случае: на
+    карточке видна только одна вариация
+    """
+
+    def __init__(self,
+                 crawl_state: CrawlState,
+                 shop: str,
+                 logger: Logger,
+                 max_age: float = 7 * DAY):
+        self.crawl_state = crawl_state
+        self.shop = shop
+        self.logger = logger
+        self.max_age = max_age
+        self.reused = 0
+        self.refetched = 0
+
+        # url -> отпечаток карточки, увиденный в этом запуске
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def note_card(self, url: str, fingerprint: str):
+        if fingerprint is not None:
+            with self._lock:
+                self._seen[url] = fingerprint
+
+    def split(self,
+              urls: List[str]) -> Tuple[List[str], Dict[str, List[Product]]]:
+        """
+        Returns:
+            Tuple: (ссылки, которые нужно загрузить, ссылка неизменившейся
+                страницы -> её продукты со свежим временем)
+        """
+        with self._lock:
+            seen = {url: self._seen.get(url) for url in urls}
+        stored = self.crawl_state.get_fingerprints(
+            [url for url, fingerprint in seen.items() if fingerprint],
+            self.shop)
+
+        now = int(time())
+        to_fetch = []
+        reused = {}
+        for url in urls:
+            fingerprint, fetched_at = stored.get(url, (None, 0))
+            if (fingerprint is None or fingerprint != seen[url]
+                    or now - fetched_at >= self.max_age):
+                to_fetch.append(url)
+                continue
+
+            products = [
+                Product(self.shop, name, article, price_reg, price_promo, now,
+                        in_stock=bool(in_stock))
+                for article, name, price_reg, price_promo, in_stock in
+                self.crawl_state.get_page_products(url, self.shop)
+            ]
+            if products:
+                reused[url] = products
+                with self._lock:
+                    self._seen.pop(url, None)
+                    self.reused += 1
+            else:
+                to_fetch.append(url)
+
+        return to_fetch, reused
+
+    def record(self, url: str, products):
+        """
+        Запоминает отпечаток карточки и продукты загруженной страницы
+
+        Args:
+            products (List): Результат process_product_link. Страница
+                сохраняется, только если каждая вариация дала продукт или
+                отметку об отсутствии (в списке нет False и None)
+        """
+        with self._lock:
+            fingerprint = self._seen.pop(url, None)
+        # Неполная страница (ошибка загрузки, пропущенные вариации) загрузится
+        # снова, иначе недостающие вариации не выдавались бы до max_age
+        if fingerprint is None or not products or not all(products):
+            return
+
+        self.crawl_state.save_page(
+            url, self.shop, fingerprint,
+            [(product.article, product.name, product.price_reg,
+              product.price_promo, int(product.in_stock))
+             for product in products], int(time()))
+        with self._lock:
+            self.refetched += 1
+
+    def log_summary(self):
+        self.logger.info(
+            f"Условное обновление: без загрузки страниц {self.reused}, "
+            f"загружено с новым отпечатком {self.refetched}")
@@ -0,0 +1,225 @@
+import math
+import threading
+from logging import Logger
+from time import time
+from typing import Dict, List, Tuple
+
+from models import parse_timestamp, rub_to_kopecks
+from storage.compaction import iter_history
+from storage.crawl_state import EMPTY_PAGE, CrawlState
+
+DAY = 24 * 60 * 60
+
+
+class ChangeRateEstimator:
+    """
+    Оценка частоты изменения цен по истории (файлы дат и products.csv).
+
+    Изменения считаются пуассоновским процессом с интенсивностью
+    (изменений + 1) / (период наблюдения + prior_interval): у товара без
+    истории частота равна априорной, и чем дольше товар наблюдается без
+    изменений, тем реже его имеет смысл перепроверять
+    """
+
+    def __init__(self, prior_interval: float = 30 * DAY):
+        self.prior_interval = prior_interval
+        # (article, shop) -> [первое время, последнее время, изменений,
+        #                     последние цены, акция ли сейчас]
+        self._stats: Dict[Tuple[str, str], list] = {}
+
+    @classmethod
+    def from_history(cls,
+                     db_path: str,
+                     prior_interval: float = 30 * DAY,
+                     archive_dir: str = ""):
+        """
+        Args:
+            db_path (str): Путь к products.csv
+            archive_dir (str): Каталог файлов дат после compact. Они читаются
+                раньше products.csv, поэтому строки каждого товара идут по
+                времени
+        """
+        estimator = cls(prior_interval)
+        for row in iter_history(db_path, archive_dir):
+            estimator.observe(row['article'], row['shop'],
+                              parse_timestamp(row['datetime']),
+                              rub_to_kopecks(row['price_reg']),
+                              rub_to_kopecks(row['price_promo']))
+        return estimator
+
+    def observe(self, article: str, shop: str, timestamp: int, price_reg: int,
+                price_promo: int):
+        key = (article, shop)
+        prices = (price_reg, price_promo)
+        stats = self._stats.get(key)
+        if stats is None:
+            self._stats[key] = [
+                timestamp, timestamp, 0, prices, price_promo < price_reg
+            ]
+            return
+
+        stats[0] = min(stats[0], timestamp)
+        stats[1] = max(stats[1], timestamp)
+        if stats[3] != prices:
+            stats[2] += 1
+            stats[3] = prices
+            stats[4] = price_promo < price_reg
+
+    def rate(self, article: str, shop: str) -> float:
+        """Ожидаемое число изменений в секунду"""
+        stats = self._stats.get((article, shop))
+        if stats is None:
+            return 1 / self.prior_interval
+        span = stats[1] - stats[0]
+        return (stats[2] + 1) / (span + self.prior_interval)
+
+    def is_promo(self, article: str, shop: str) -> bool:
+        stats = self._stats.get((article, shop))
+        return bool(stats and stats[4])
+
+
+class RecrawlScheduler:
+    """
+    Планировщик повторного обхода: решает, какие страницы продуктов стоит
+    загрузить в этом запуске.
+
+    Для известной страницы считается вероятность того, что цена изменилась с
+    момента последней загрузки: 1 - exp(-rate * прошло_времени), для акционных
+    товаров она умножается на promo_weight. Новые страницы загружаются в первую
+    очередь. Бюджет запросов на запуск расходуется на страницы с наибольшей
+    вероятностью изменения, стабильные товары обновляются реже, но с ростом
+    времени с последней загрузки их вероятность тоже растёт
+    """
+
+    def __init__(self,
+                 crawl_state: CrawlState,
+                 estimator: ChangeRateEstimator,
+                 shop: str,
+                 logger: Logger,
+                 request_budget: int = 0,
+                 min_change_probability: float = 0.05,
+                 promo_weight: float = 2.0):
+        """
+        Args:
+            request_budget (int): Максимум запросов к страницам продуктов за
+                запуск, 0 - без ограничения
+            min_change_probability (float): Порог, ниже которого страница не
+                загружается даже при свободном бюджете
+        """
+        self.crawl_state = crawl_state
+        self.estimator = estimator
+        self.shop = shop
+        self.logger = logger
+        self.request_budget = request_budget
+        self.min_change_probability = min_change_probability
+        self.promo_weight = promo_weight
+        self.requests_spent = 0
+        self.skipped = 0
+        # Списанная при допуске оценка стоимости страницы, уточняется в record
+        self._charged: Dict[str, int] = {}
+        # Фактическая стоимость загруженных в этом запуске страниц - для
+        # оценки новых страниц, вариации которых ещё неизвестны
+        self._fetched_pages = 0
+        self._fetched_requests = 0
+        self._lock = threading.Lock()
+
+    def score(self, pages: List[Tuple[str, int]], now: float) -> float:
+        """
+        Вероятность изменения хотя бы одной вариации продукта
+
+        Args:
+            pages (List[Tuple]): [(артикул, время последней загрузки)]. Для
+                страницы без продуктов (EMPTY_PAGE) берётся априорная частота
+        """
+        if not pages:
+            return 1.0
+
+        unchanged = 1.0
+        for article, last_crawled in pages:
+            elapsed = max(now - last_crawled, 0)
+            probability = 1 - math.exp(
+                -self.estimator.rate(article, self.shop) * elapsed)
+            if self.estimator.is_promo(article, self.shop):
+                probability = min(1.0, probability * self.promo_weight)
+            unchanged *= 1 - probability
+        return 1 - unchanged
+
+    def select(self, urls: List[str]) -> List[str]:
+        """
+        Отбирает из пачки ссылок те, что стоит загрузить, в порядке убывания
+        вероятности изменения, и списывает их стоимость из бюджета. Стоимость
+        страницы - сама страница плюс известные вариации, для новой страницы -
+        средняя стоимость загруженных. После загрузки record списывает
+        фактическое число запросов
+        """
+        now = time()
+        known = self.crawl_state.get_pages(urls, self.shop)
+        ranked = sorted(((self.score(known.get(url, []), now), url)
+                         for url in urls),
+                        reverse=True)
+
+        selected = []
+        with self._lock:
+            for probability, url in ranked:
+                if probability < self.min_change_probability:
+                    break
+                if self._spend(url, self._cost(known.get(url, []))):
+                    selected.append(url)
+            self.skipped += len(urls) - len(selected)
+
+        return selected
+
+    def admit(self, url: str) -> bool:
+        """
+        Решает по одной ссылке, загружать ли её, и списывает её стоимость из
+        бюджета. Для очереди по приоритету: бюджет тратится в порядке
+        приоритета, а не в порядке, в котором ссылки попали в очередь
+        """
+        pages = self.crawl_state.get_pages([url], self.shop).get(url, [])
+        probability = self.score(pages, time())
+        with self._lock:
+            admitted = (probability >= self.min_change_probability
+                        and self._spend(url, self._cost(pages)))
+            if not admitted:
+                self.skipped += 1
+        return admitted
+
+    def _cost(self, pages: List[Tuple[str, int]]) -> int:
+        if not pages:
+            if not self._fetched_pages:
+                return 1
+            return max(1, round(self._fetched_requests / self._fetched_pages))
+        # Сама страница плюс известные вариации
+        return 1 + sum(1 for article, _ in pages if article != EMPTY_PAGE)
+
+    def _spend(self, url: str, cost: int) -> bool:
+        if self.request_budget and self.requests_spent + cost > self.request_budget:
+            return False
+        self.requests_spent += cost
+        self._charged[url] = cost
+        return True
+
+    def record(self, url: str, products):
+        """
+        Запоминает результат загрузки страницы продукта и списывает из
+        бюджета разницу между фактическим числом запросов и оценкой
+
+        Args:
+            products (List): Результат process_product_link. None - вариация,
+                которая не загружалась, остальные элементы - по запросу на
+                вариацию
+        """
+        requests = 1 + sum(1 for product in products if product is not None)
+        with self._lock:
+            self.requests_spent += requests - self._charged.pop(url, 0)
+            self._fetched_pages += 1
+            self._fetched_requests += requests
+
+        articles = [product.article for product in products if product]
+        self.crawl_state.record_crawl(url, self.shop, articles, int(time()))
+
+    def log_summary(self):
+        self.logger.info(
+            f"Планировщик: потрачено запросов {self.requests_spent}"
+            f" из {self.request_budget or 'без ограничения'}, пропущено страниц {self.skipped}"
+        )
@@ -0,0 +1,132 @@
+import re
+import zlib
+from logging import Logger
+from typing import Iterator, List
+from urllib.parse import urljoin
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+from utils.network_utility import NetworkConnector
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _local_name(tag: str) -> str:
+    """Имя тега без пространства имён: {http://...}loc -> loc"""
+    return tag.rsplit('}', 1)[-1]
+
+
+class SitemapReader:
+    """
+    Потоковое чтение sitemap сайта.
+
+    XML разбирается инкрементально по мере скачивания (XMLPullParser), поэтому
+    в памяти никогда не лежит весь файл целиком. Поддерживаются индексы
+    sitemap (sitemapindex) и файлы, сжатые gzip (*.xml.gz)
+    """
+
+    def __init__(self,
+                 network_connector: NetworkConnector,
+                 logger: Logger,
+                 product_patterns: List[str],
+                 chunk_size: int = 64 * 1024):
+        self.network_connector = network_connector
+        self.logger = logger
+        self.product_patterns = [
+            re.compile(pattern) for pattern in product_patterns
+        ]
+        self.chunk_size = chunk_size
+
+    def is_product_url(self, url: str) -> bool:
+        return any(pattern.search(url) for pattern in self.product_patterns)
+
+    def iter_product_urls(self, sitemap_url: str) -> Iterator[str]:
+        """
+        Обходит sitemap (и вложенные индексы) и отдаёт ссылки на продукты,
+        подходящие под шаблоны из конфигурации. Дубликаты отбрасываются
+
+        Args:
+            sitemap_url (str): Ссылка на sitemap.xml или индекс sitemap
+        """
+        pending = [sitemap_url]
+        visited = set()
+        seen_products = set()
+
+        while pending:
+            url = pending.pop(0)
+            if url in visited:
+                continue
+            visited.add(url)
+
+            self.logger.info(f"Чтение sitemap: {url}")
+            for kind, loc in self._iter_locations(url):
+                if kind == 'sitemap':
+                    pending.append(urljoin(url, loc))
+                elif self.is_product_url(loc) and loc not in seen_products:
+                    seen_products.add(loc)
+                    yield loc
+
+        self.logger.info(
+            f"Sitemap обработан: файлов {len(visited)}, продуктов {len(seen_products)}"
+        )
+
+    def _iter_locations(self, url: str):
+        """
+        Отдаёт пары (тип, ссылка): 'sitemap' для вложенных индексов и 'url' для
+        страниц сайта
+        """
+        response = self.network_connector.safe_request(url, stream=True)
+        if response is None:
+            self.logger.error(f"Не удалось скачать sitemap {url}")
+            return
+
+        parser = XMLPullParser(events=('start', 'end'))
+        root = []
+        decompressor = None
+        first_chunk = True
+        try:
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                if not chunk:
+                    continue
+                # requests сам снимает Content-Encoding: gzip, но файл *.xml.gz
+                # обычно отдаётся как application/gzip, без этого заголовка
+                if first_chunk:
+                    first_chunk = False
+                    if chunk.startswith(GZIP_MAGIC):
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                if decompressor is not None:
+                    chunk = decompressor.decompress(chunk)
+
+                parser.feed(chunk)
+                yield from self._drain_events(parser, root)
+
+            if decompressor is not None:
+                parser.feed(decompressor.flush())
+            parser.close()
+            yield from self._drain_events(parser, root)
+
+        except (ParseError, zlib.error) as e:
+            self.logger.error(f"Ошибка разбора sitemap {url}: {e}")
+        finally:
+            response.close()
+
+    def _drain_events(self, parser: XMLPullParser, root: list):
+        for event, element in parser.read_events():
+            if event == 'start':
+                if not root:
+                    root.append(element)
+                continue
+
+            name = _local_name(element.tag)
+            if name not in ('url', 'sitemap'):
+                continue
+
+            loc = None
+            for child in element:
+                if _local_name(child.tag) == 'loc':
+                    loc = (child.text or '').strip()
+                    break
+            if loc:
+                yield name, loc
+
+            # Освобождаем уже разобранные элементы, чтобы дерево не росло
+            root[0].clear()
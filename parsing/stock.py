@@ -0,0 +1,109 @@
+import threading
+from logging import Logger
+from time import time
+from typing import Dict, List
+
+from storage.crawl_state import CrawlState
+
+HOUR = 60 * 60
+
+
+class StockFilter:
+    """
+    Пропуск загрузки вариаций продуктов, которых нет в наличии.
+
+    Наличие берётся из переключателя вариаций на странице родительского
+    продукта: в нём у каждой вариации своя отметка. Карточка в списке
+    продуктов не подходит - на ней видна только одна вариация, поэтому
+    страница продукта загружается всегда, а отбираются её вариации. Для
+    каждой ссылки известно одно из трёх: отмечена как отсутствующая,
+    отмечена как доступная или отметки нет.
+
+    Страницы, которые оказались не в наличии, запоминаются в CrawlState. Если
+    отметки наличия нет, такие страницы не загружаются, пока не подойдёт время
+    повторной проверки (recheck_interval). Отметка "в наличии" всегда приводит
+    к загрузке
+    """
+
+    def __init__(self,
+                 crawl_state: CrawlState,
+                 shop: str,
+                 logger: Logger,
+                 report_out_of_stock: bool = False,
+                 recheck_interval: float = 24 * HOUR):
+        """
+        Args:
+            report_out_of_stock (bool): Нужны ли отметки об отсутствии в
+                выгрузке. Тогда страница, впервые отмеченная как отсутствующая,
+                всё же загружается один раз, чтобы записать переход
+            recheck_interval (float): Через сколько секунд повторно проверять
+                отсутствующие страницы, 0 - не проверять те, что отмечены
+                как отсутствующие, и всегда загружать страницы без отметки
+        """
+        self.crawl_state = crawl_state
+        self.shop = shop
+        self.logger = logger
+        self.report_out_of_stock = report_out_of_stock
+        self.recheck_interval = recheck_interval
+        self.skipped = 0
+        self.rechecks = 0
+        self._known_unavailable = set()
+        self._lock = threading.Lock()
+
+    def filter(self, urls: List[str], out_of_stock: Dict[str, bool]) -> List[str]:
+        """
+        Args:
+            urls (List[str]): Ссылки на страницы вариаций
+            out_of_stock (Dict[str, bool]): Отметки наличия: True - нет в
+                наличии, False - в наличии, ссылки без отметки отсутствуют
+
+        Returns:
+            List[str]: Ссылки, которые нужно загрузить
+        """
+        known = self.crawl_state.get_unavailable(list(urls), self.shop)
+        now = int(time())
+        selected = []
+        skipped = 0
+        rechecks = 0
+        for url in urls:
+            marked = out_of_stock.get(url)
+            last_checked = known.get(url)
+
+            if marked is False:
+                selected.append(url)
+            elif last_checked is None:
+                if marked and not self.report_out_of_stock:
+                    self.crawl_state.mark_unavailable(url, self.shop, now)
+                    skipped += 1
+                else:
+                    selected.append(url)
+            elif (not marked and not self.recheck_interval) or (
+                    self.recheck_interval
+                    and now - last_checked >= self.recheck_interval):
+                selected.append(url)
+                rechecks += 1
+            else:
+                skipped += 1
+
+        with self._lock:
+            self._known_unavailable.update(known)
+            self.skipped += skipped
+            self.rechecks += rechecks
+        return selected
+
+    def record(self, url: str, in_stock: bool):
+        """Запоминает наличие по загруженной странице продукта"""
+        if not in_stock:
+            self.crawl_state.mark_unavailable(url, self.shop, int(time()))
+            return
+
+        with self._lock:
+            was_unavailable = url in self._known_unavailable
+            self._known_unavailable.discard(url)
+        if was_unavailable:
+            self.crawl_state.mark_available(url, self.shop)
+
+    def log_summary(self):
+        self.logger.info(
+            f"Наличие: пропущено страниц не в наличии {self.skipped}, "
+            f"повторных проверок {self.rechecks}")
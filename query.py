@@ -0,0 +1,110 @@
+import argparse
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from models import format_kopecks, format_timestamp
+from storage.product_index import ProductIndex
+
+
+def _day_start(value: str) -> int:
+    return int(datetime.strptime(value, '%Y-%m-%d').timestamp())
+
+
+def _day_end(value: str) -> int:
+    day = datetime.strptime(value, '%Y-%m-%d') + timedelta(days=1)
+    return int(day.timestamp()) - 1
+
+
+def _print_rows(rows, with_discount=False):
+    for row in rows:
+        article, shop, ts, price_reg, price_promo, name, category = row[:7]
+        columns = [
+            format_timestamp(ts), article,
+            format_kopecks(price_reg),
+            format_kopecks(price_promo), shop, name, category
+        ]
+        if with_discount:
+            columns.insert(2, format_kopecks(row[7]))
+        print("\t".join(columns))
+
+
+def build_arg_parser(parser=None):
+    """
+    Аргументы команды запросов. Может дополнять переданный парсер (например,
+    подкоманду главного CLI)
+    """
+    if parser is None:
+        parser = argparse.ArgumentParser(
+            description="Запросы к истории цен по индексу products.csv")
+    parser.add_argument("--csv", default="products.csv", help="Путь к CSV")
+    parser.add_argument("--index",
+                        default="products_index.db",
+                        help="Путь к файлу индекса")
+    parser.add_argument("--archive",
+                        default="archive",
+                        help="Каталог файлов дат после compact")
+    commands = parser.add_subparsers(dest="query_command", required=True)
+
+    price = commands.add_parser("price", help="Цена артикула на дату")
+    price.add_argument("article")
+    price.add_argument("--date",
+                       default=datetime.now().strftime('%Y-%m-%d'),
+                       help="YYYY-MM-DD, по умолчанию - сегодня")
+    price.add_argument("--shop")
+
+    history = commands.add_parser("history", help="История цен артикула")
+    history.add_argument("article")
+    history.add_argument("--from", dest="date_from", default="1970-01-02")
+    history.add_argument("--to",
+                         dest="date_to",
+                         default=datetime.now().strftime('%Y-%m-%d'))
+    history.add_argument("--shop")
+
+    prefix = commands.add_parser("prefix", help="Поиск по началу артикула")
+    prefix.add_argument("prefix")
+    prefix.add_argument("--limit", type=int, default=50)
+
+    search = commands.add_parser("search", help="Поиск по словам названия")
+    search.add_argument("words", nargs="+")
+    search.add_argument("--limit", type=int, default=50)
+
+    discounts = commands.add_parser("discounts",
+                                    help="Top-N скидок по последним ценам")
+    discounts.add_argument("--limit", type=int, default=20)
+    discounts.add_argument("--shop")
+
+    return parser
+
+
+def run_query(args) -> int:
+    started = perf_counter()
+    index = ProductIndex(args.index, args.csv, args.archive)
+    index.refresh()
+    refreshed = perf_counter()
+
+    if args.query_command == "price":
+        _print_rows(index.price_at(args.article, _day_end(args.date),
+                                   args.shop))
+    elif args.query_command == "history":
+        _print_rows(
+            index.history(args.article, _day_start(args.date_from),
+                          _day_end(args.date_to), args.shop))
+    elif args.query_command == "prefix":
+        _print_rows(index.article_prefix(args.prefix, args.limit))
+    elif args.query_command == "search":
+        _print_rows(index.search_name(args.words, args.limit))
+    elif args.query_command == "discounts":
+        _print_rows(index.top_discounts(args.limit, args.shop),
+                    with_discount=True)
+
+    index.close()
+    print(
+        f"Обновление индекса: {(refreshed - started) * 1000:.1f} мс, "
+        f"запрос: {(perf_counter() - refreshed) * 1000:.1f} мс",
+        file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_query(build_arg_parser().parse_args()))
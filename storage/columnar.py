@@ -0,0 +1,166 @@
+import csv
+import sys
+import logging
+import uuid
+from time import localtime, strftime
+
+from models import parse_timestamp, rub_to_kopecks
+
+logger = logging.getLogger('Parser')
+
+PARTITION_COLUMNS = ["date", "shop"]
+
+
+def _import_pyarrow():
+    """
+    pyarrow - необязательная зависимость, нужна только для колоночного
+    хранилища, поэтому импортируется при первом использовании
+    """
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError(
+            "Для колоночного экспорта нужен pyarrow: pip install pyarrow"
+        ) from e
+    return pyarrow, pyarrow.dataset
+
+
+def product_schema(pa):
+    """
+    Схема файлов. Магазин и категория словарно кодируются, цены - целые
+    копейки. datetime - местное время без часового пояса, как в products.csv:
+    дата в нём всегда совпадает с разделом date
+    """
+    return pa.schema([
+        ("datetime", pa.timestamp("s")),
+        ("price_reg", pa.int64()),
+        ("price_promo", pa.int64()),
+        ("article", pa.string()),
+        ("name", pa.string()),
+        ("category_path", pa.dictionary(pa.int32(), pa.string())),
+        ("date", pa.string()),
+        ("shop", pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+
+class ParquetSink:
+    """
+    Колоночное хранилище истории в Parquet, разбитое на каталоги по дате
+    обхода и магазину: root/date=2025-02-04/shop=.../part-*.parquet.
+
+    Строки копятся в памяти по столбцам и сбрасываются файлами по
+    flush_rows строк, чтобы не плодить мелкие файлы на каждую категорию
+    """
+
+    def __init__(self, root_path: str, flush_rows: int = 100_000):
+        self.pa, self.ds = _import_pyarrow()
+        self.root_path = root_path
+        self.flush_rows = flush_rows
+        self.schema = product_schema(self.pa)
+        self._columns = {name: [] for name in self.schema.names}
+        self._rows = 0
+        self._last_timestamp = None
+        self._last_local = 0
+        self._last_date = ""
+
+    def _localize(self, timestamp: int):
+        """
+        Returns:
+            Tuple: (местное время в секундах от эпохи, дата раздела)
+        """
+        if timestamp != self._last_timestamp:
+            self._last_timestamp = timestamp
+            local = localtime(timestamp)
+            self._last_local = timestamp + local.tm_gmtoff
+            self._last_date = strftime('%Y-%m-%d', local)
+        return self._last_local, self._last_date
+
+    def append(self, timestamp: int, price_reg: int, price_promo: int,
+               article: str, name: str, category_path: str, shop: str):
+        columns = self._columns
+        local, date = self._localize(timestamp)
+        columns["datetime"].append(local)
+        columns["price_reg"].append(price_reg)
+        columns["price_promo"].append(price_promo)
+        columns["article"].append(article)
+        columns["name"].append(name)
+        columns["category_path"].append(category_path)
+        columns["date"].append(date)
+        columns["shop"].append(shop)
+        self._rows += 1
+        if self._rows >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+
+        table = self.pa.Table.from_pydict(self._columns, schema=self.schema)
+        self.ds.write_dataset(
+            table,
+            self.root_path,
+            format="parquet",
+            partitioning=self.ds.partitioning(self.pa.schema(
+                [self.schema.field(name) for name in PARTITION_COLUMNS]),
+                                              flavor="hive"),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore")
+
+        logger.info(f"В {self.root_path} записано строк: {self._rows}")
+        self._columns = {name: [] for name in self.schema.names}
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+
+
+def open_dataset(root_path: str):
+    """
+    Открывает историю для чтения. Фильтры по date/shop отсекают каталоги
+    целиком, а читаются только запрошенные столбцы, например:
+    open_dataset(path).to_table(columns=["article", "price_promo"],
+                                filter=ds.field("date") == "2025-02-04")
+    """
+    _, ds = _import_pyarrow()
+    return ds.dataset(root_path,
+                      format="parquet",
+                      partitioning=ds.HivePartitioning.discover(
+                          infer_dictionary=True))
+
+
+def convert_csv_history(csv_path: str,
+                        root_path: str,
+                        flush_rows: int = 100_000) -> int:
+    """
+    Однократно переносит историю из products.csv в колоночное хранилище,
+    читая файл потоком
+
+    Returns:
+        int: Количество перенесённых строк
+    """
+    sink = ParquetSink(root_path, flush_rows)
+    count = 0
+    with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            try:
+                sink.append(parse_timestamp(row['datetime']),
+                            rub_to_kopecks(row['price_reg']),
+                            rub_to_kopecks(row['price_promo']),
+                            row['article'], row['name'], row['category_path'],
+                            row['shop'])
+                count += 1
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Пропущена строка {row}: {e}")
+    sink.close()
+
+    logger.info(f"Перенесено строк из {csv_path}: {count}")
+    return count
+
+
+if __name__ == "__main__":
+    # python -m storage.columnar products.csv history
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+    convert_csv_history(sys.argv[1] if len(sys.argv) > 1 else "products.csv",
+                        sys.argv[2] if len(sys.argv) > 2 else "history")
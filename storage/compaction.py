@@ -0,0 +1,220 @@
+import csv
+import heapq
+import os
+import shutil
+import tempfile
+import logging
+from typing import Iterator, List, Set, Tuple
+
+logger = logging.getLogger('Parser')
+
+FIELDNAMES = [
+    "shop", "datetime", "price_reg", 'price_promo', 'article', 'name',
+    'category_path'
+]
+SHARD_PREFIX = "products_"
+
+# Индексы колонок в строке products.csv
+_SHOP, _DATETIME, _ARTICLE = 0, 1, 4
+
+
+def shard_path(output_dir: str, date: str) -> str:
+    return os.path.join(output_dir, f"{SHARD_PREFIX}{date}.csv")
+
+
+def archive_shards(output_dir: str) -> List[str]:
+    """Файлы дат в порядке дат, пустой список - каталога ещё нет"""
+    if not output_dir or not os.path.isdir(output_dir):
+        return []
+    return [
+        os.path.join(output_dir, name)
+        for name in sorted(os.listdir(output_dir))
+        if name.startswith(SHARD_PREFIX) and name.endswith(".csv")
+    ]
+
+
+def history_paths(csv_path: str, archive_dir: str = "") -> List[str]:
+    """
+    Вся история по порядку: сначала сжатые файлы дат, затем products.csv с
+    дописанными после сжатия строками
+    """
+    paths = archive_shards(archive_dir)
+    if os.path.exists(csv_path):
+        paths.append(csv_path)
+    return paths
+
+
+def iter_history(csv_path: str, archive_dir: str = "") -> Iterator[dict]:
+    """Строки всей истории (csv.DictReader)"""
+    for path in history_paths(csv_path, archive_dir):
+        with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+            yield from csv.DictReader(csvfile)
+
+
+def _sort_key(row: List[str]) -> Tuple[str, str, str, str]:
+    # Дата, затем ключ дедупликации (артикул, ТТ, минута), затем время
+    return (row[_DATETIME][:10], row[_ARTICLE], row[_SHOP], row[_DATETIME])
+
+
+def _dedupe_key(row: List[str]) -> Tuple[str, str, str]:
+    return (row[_ARTICLE], row[_SHOP], row[_DATETIME][:16])
+
+
+def _iter_csv(path: str) -> Iterator[List[str]]:
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        for row in reader:
+            if row and row[0] != "shop":
+                yield row
+
+
+def _write_sorted_runs(csv_path: str, tmp_dir: str,
+                       chunk_rows: int) -> Tuple[List[str], Set[str], int]:
+    """
+    Первый проход внешней сортировки: читает CSV кусками по chunk_rows строк,
+    сортирует каждый кусок в памяти и сохраняет во временный файл
+
+    Returns:
+        Tuple: (пути отсортированных кусков, встреченные даты, прочитано строк)
+    """
+    runs = []
+    dates = set()
+    read = 0
+    chunk = []
+
+    def flush_chunk():
+        chunk.sort(key=_sort_key)
+        run_path = os.path.join(tmp_dir, f"run_{len(runs):05d}.csv")
+        with open(run_path, 'w', newline='', encoding='utf-8') as run_file:
+            csv.writer(run_file).writerows(chunk)
+        runs.append(run_path)
+        chunk.clear()
+
+    for row in _iter_csv(csv_path):
+        if len(row) != len(FIELDNAMES) or len(row[_DATETIME]) < 16:
+            logger.warning(f"Пропущена строка {row}")
+            continue
+        chunk.append(row)
+        dates.add(row[_DATETIME][:10])
+        read += 1
+        if len(chunk) >= chunk_rows:
+            flush_chunk()
+    if chunk:
+        flush_chunk()
+
+    return runs, dates, read
+
+
+def _merge_into_shards(rows: Iterator[List[str]], output_dir: str,
+                       tmp_dir: str) -> Tuple[int, int]:
+    """
+    Второй проход: слияние отсортированного потока с удалением повторов и
+    раскладкой по файлам дат. Из строк с одинаковыми (артикул, ТТ, минута)
+    остаётся последняя. Файл даты пишется во временный и подменяет прежний
+    целиком
+
+    Returns:
+        Tuple: (записано строк, удалено повторов)
+    """
+    written = duplicates = 0
+    current_date = None
+    shard_file = writer = None
+    pending = None
+
+    def finish_shard():
+        shard_file.close()
+        os.replace(os.path.join(tmp_dir, "shard.csv"),
+                   shard_path(output_dir, current_date))
+
+    def emit(row):
+        nonlocal current_date, shard_file, writer, written
+        date = row[_DATETIME][:10]
+        if date != current_date:
+            if shard_file is not None:
+                finish_shard()
+            current_date = date
+            shard_file = open(os.path.join(tmp_dir, "shard.csv"),
+                              'w',
+                              newline='',
+                              encoding='utf-8')
+            writer = csv.writer(shard_file)
+            writer.writerow(FIELDNAMES)
+        writer.writerow(row)
+        written += 1
+
+    for row in rows:
+        if pending is not None and _dedupe_key(pending) == _dedupe_key(row):
+            duplicates += 1
+        elif pending is not None:
+            emit(pending)
+        pending = row
+
+    if pending is not None:
+        emit(pending)
+    if shard_file is not None:
+        finish_shard()
+
+    return written, duplicates
+
+
+def _truncate(csv_path: str):
+    """Оставляет в csv_path только заголовок, подменяя файл целиком"""
+    tmp_fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(csv_path)), suffix=".tmp")
+    try:
+        with os.fdopen(tmp_fd, 'w', newline='', encoding='utf-8') as csvfile:
+            csv.writer(csvfile).writerow(FIELDNAMES)
+        os.replace(tmp_path, csv_path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+
+def compact_history(csv_path: str,
+                    output_dir: str,
+                    chunk_rows: int = 100_000) -> int:
+    """
+    Офлайн-сжатие истории: products.csv сортируется внешней сортировкой,
+    сливается с уже существующими файлами тех же дат, очищается от повторов
+    (артикул, ТТ, минута) и раскладывается по файлам products_YYYY-MM-DD.csv.
+    В памяти одновременно не больше chunk_rows строк.
+
+    Перенесённые строки убираются из csv_path: он подменяется файлом с одним
+    заголовком после того, как все файлы дат записаны. Если процесс прервётся
+    между этими шагами, строки окажутся и там, и там, и следующее сжатие
+    уберёт их как повторы. Индекс цен, оценка частоты изменений и индекс
+    запросов читают файлы дат вместе с csv_path (iter_history).
+
+    Запускается, когда парсер не пишет в csv_path
+
+    Args:
+        csv_path (str): Путь к products.csv
+        output_dir (str): Каталог файлов по датам
+        chunk_rows (int): Размер куска для сортировки в памяти
+
+    Returns:
+        int: Количество строк в обновлённых файлах дат
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".compact-", dir=output_dir)
+    try:
+        runs, dates, read = _write_sorted_runs(csv_path, tmp_dir, chunk_rows)
+
+        # Уже сжатые файлы отсортированы так же, поэтому сливаются напрямую.
+        # Они идут первыми: при равных ключах новые строки побеждают
+        shards = [
+            shard_path(output_dir, date) for date in sorted(dates)
+            if os.path.exists(shard_path(output_dir, date))
+        ]
+        merged = heapq.merge(*[_iter_csv(path) for path in shards + runs],
+                             key=_sort_key)
+        written, duplicates = _merge_into_shards(merged, output_dir, tmp_dir)
+        if read:
+            _truncate(csv_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    logger.info(
+        f"Сжатие {csv_path}: прочитано строк {read}, удалено повторов "
+        f"{duplicates}, записано {written} в файлы {len(dates)} дат")
+    return written
@@ -0,0 +1,198 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Артикул строки product_pages для загруженной страницы без продуктов: время
+# загрузки нужно знать и для неё, иначе она считалась бы новой каждый запуск
+EMPTY_PAGE = ""
+
+
+class CrawlState:
+    """
+    Служебное состояние обхода между запусками (SQLite).
+
+    В products.csv нет ссылок на продукты, поэтому здесь хранится соответствие
+    ссылки на страницу продукта его артикулам (вариациям) и время последней
+    загрузки страницы, страницы, которые при последней проверке были не в
+    наличии, а также отпечатки карточек из списков вместе с последними
+    продуктами страницы
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS product_pages (
+                url TEXT NOT NULL,
+                article TEXT NOT NULL,
+                shop TEXT NOT NULL,
+                last_crawled INTEGER NOT NULL,
+                PRIMARY KEY (url, shop, article)
+            );
+            CREATE INDEX IF NOT EXISTS product_pages_article
+                ON product_pages (article);
+            CREATE TABLE IF NOT EXISTS unavailable_pages (
+                url TEXT NOT NULL,
+                shop TEXT NOT NULL,
+                since INTEGER NOT NULL,
+                last_checked INTEGER NOT NULL,
+                PRIMARY KEY (url, shop)
+            );
+            CREATE TABLE IF NOT EXISTS card_fingerprints (
+                url TEXT NOT NULL,
+                shop TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                fetched_at INTEGER NOT NULL,
+                PRIMARY KEY (url, shop)
+            );
+            CREATE TABLE IF NOT EXISTS page_products (
+                url TEXT NOT NULL,
+                shop TEXT NOT NULL,
+                article TEXT NOT NULL,
+                name TEXT NOT NULL,
+                price_reg INTEGER NOT NULL,
+                price_promo INTEGER NOT NULL,
+                in_stock INTEGER NOT NULL,
+                PRIMARY KEY (url, shop, article)
+            );
+        """)
+        self._conn.commit()
+
+    def record_crawl(self, url: str, shop: str, articles: Iterable[str],
+                     timestamp: int):
+        """
+        Запоминает, что страница продукта была загружена и какие артикулы на
+        ней найдены, заменяя прежний набор: артикулы, пропавшие со страницы,
+        иначе навсегда остались бы "давно не загруженными". Если продуктов
+        нет, у известной страницы обновляется время загрузки, а новая
+        записывается с артикулом EMPTY_PAGE
+        """
+        rows = [(url, article, shop, timestamp) for article in articles]
+        with self._lock:
+            if rows:
+                self._conn.execute(
+                    "DELETE FROM product_pages WHERE url = ? AND shop = ?",
+                    (url, shop))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO product_pages VALUES (?, ?, ?, ?)",
+                    rows)
+            elif not self._conn.execute(
+                    """UPDATE product_pages SET last_crawled = ?
+                       WHERE url = ? AND shop = ?""",
+                    (timestamp, url, shop)).rowcount:
+                self._conn.execute(
+                    "INSERT INTO product_pages VALUES (?, ?, ?, ?)",
+                    (url, EMPTY_PAGE, shop, timestamp))
+            self._conn.commit()
+
+    def get_pages(self, urls: List[str],
+                  shop: str) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Returns:
+            Dict: url -> [(article, last_crawled)] для уже известных страниц
+                ТТ. У страницы без продуктов единственный артикул - EMPTY_PAGE
+        """
+        pages = {}
+        with self._lock:
+            # Ограничение SQLite на число параметров в запросе
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"""SELECT url, article, last_crawled FROM product_pages
+                        WHERE shop = ? AND url IN ({placeholders})""",
+                    [shop] + chunk).fetchall()
+                for url, article, last_crawled in rows:
+                    pages.setdefault(url, []).append((article, last_crawled))
+        return pages
+
+    def get_unavailable(self, urls: List[str], shop: str) -> Dict[str, int]:
+        """
+        Returns:
+            Dict: url -> время последней проверки для страниц, отмеченных как
+                отсутствующие в наличии
+        """
+        unavailable = {}
+        with self._lock:
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"""SELECT url, last_checked FROM unavailable_pages
+                        WHERE shop = ? AND url IN ({placeholders})""",
+                    [shop] + chunk).fetchall()
+                unavailable.update(rows)
+        return unavailable
+
+    def mark_unavailable(self, url: str, shop: str, timestamp: int):
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO unavailable_pages VALUES (?, ?, ?, ?)
+                   ON CONFLICT (url, shop)
+                   DO UPDATE SET last_checked = excluded.last_checked""",
+                (url, shop, timestamp, timestamp))
+            self._conn.commit()
+
+    def mark_available(self, url: str, shop: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM unavailable_pages WHERE url = ? AND shop = ?",
+                (url, shop))
+            self._conn.commit()
+
+    def get_fingerprints(self, urls: List[str],
+                         shop: str) -> Dict[str, Tuple[str, int]]:
+        """
+        Returns:
+            Dict: url -> (отпечаток карточки, время загрузки страницы)
+        """
+        fingerprints = {}
+        with self._lock:
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"""SELECT url, fingerprint, fetched_at
+                        FROM card_fingerprints
+                        WHERE shop = ? AND url IN ({placeholders})""",
+                    [shop] + chunk).fetchall()
+                for url, fingerprint, fetched_at in rows:
+                    fingerprints[url] = (fingerprint, fetched_at)
+        return fingerprints
+
+    def get_page_products(self, url: str, shop: str) -> List[Tuple]:
+        """
+        Returns:
+            List: [(артикул, название, цена, цена по акции, в наличии)] с
+                последней загрузки страницы
+        """
+        with self._lock:
+            return self._conn.execute(
+                """SELECT article, name, price_reg, price_promo, in_stock
+                   FROM page_products WHERE url = ? AND shop = ?""",
+                (url, shop)).fetchall()
+
+    def save_page(self, url: str, shop: str, fingerprint: str,
+                  products: List[Tuple], timestamp: int):
+        """
+        Запоминает отпечаток карточки и продукты страницы, заменяя прежние
+
+        Args:
+            products: [(артикул, название, цена, цена по акции, в наличии)]
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM page_products WHERE url = ? AND shop = ?",
+                (url, shop))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO page_products VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(url, shop) + tuple(product) for product in products])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO card_fingerprints VALUES (?, ?, ?, ?)",
+                (url, shop, fingerprint, timestamp))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
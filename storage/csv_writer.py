@@ -0,0 +1,121 @@
+import csv
+import os
+import queue
+import threading
+import logging
+from time import monotonic
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger('Parser')
+
+# Служебный элемент очереди: пора проверить таймеры сброса
+_TICK = object()
+
+
+class BackgroundCSVWriter:
+    """
+    Дозапись строк в CSV фоновым потоком через один буферизованный
+    дескриптор файла.
+
+    Потоки парсинга только кладут пачки строк в очередь. Буфер сбрасывается в
+    файл не чаще раза в flush_interval секунд, а fsync делается раз в
+    fsync_interval секунд и при закрытии. Инкрементальные читатели (индекс
+    запросов) разбирают только завершённые строки, поэтому недописанный хвост
+    им не мешает
+    """
+
+    def __init__(self,
+                 path: str,
+                 header: Optional[List[str]] = None,
+                 flush_interval: float = 5.0,
+                 fsync_interval: float = 30.0,
+                 buffer_size: int = 1024 * 1024):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.rows_written = 0
+        self.fsyncs = 0
+
+        self._file = open(path,
+                          'a',
+                          newline='',
+                          encoding='utf-8',
+                          buffering=buffer_size)
+        self._writer = csv.writer(self._file)
+        if header and self._file.tell() == 0:
+            self._writer.writerow(header)
+            self._file.flush()
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                                        name=f"csv-writer:{path}",
+                                        daemon=True)
+        self._thread.start()
+
+    def write_rows(self, rows: Iterable):
+        """Ставит строки в очередь на запись, не дожидаясь диска"""
+        rows = list(rows)
+        if rows:
+            self._queue.put(rows)
+
+    def flush(self):
+        """Ждёт, пока все поставленные строки не окажутся на диске"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        last_flush = last_fsync = monotonic()
+        buffered, synced = False, True
+        while True:
+            # Без несброшенных данных ждём следующую пачку сколько угодно
+            timeout = None
+            if buffered:
+                timeout = max(0.0,
+                              last_flush + self.flush_interval - monotonic())
+            elif not synced:
+                timeout = max(0.0,
+                              last_fsync + self.fsync_interval - monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = _TICK
+
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                self._sync()
+                buffered, synced = False, True
+                last_flush = last_fsync = monotonic()
+                item.set()
+                continue
+            if item is not _TICK:
+                try:
+                    self._writer.writerows(item)
+                    self.rows_written += len(item)
+                    buffered, synced = True, False
+                except (OSError, csv.Error) as e:
+                    logger.error(f"Ошибка записи в {self.path}: {e}")
+
+            now = monotonic()
+            if buffered and now - last_flush >= self.flush_interval:
+                self._file.flush()
+                buffered, last_flush = False, now
+            if not synced and now - last_fsync >= self.fsync_interval:
+                self._sync()
+                buffered, synced, last_fsync = False, True, now
+
+        self._sync()
+        self._file.close()
+
+    def _sync(self):
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+        except OSError as e:
+            logger.error(f"Ошибка сброса на диск {self.path}: {e}")
@@ -0,0 +1,108 @@
+import os
+import csv
+import logging
+from typing import Dict, Optional, Tuple
+
+from models import Product, rub_to_kopecks
+from storage.compaction import iter_history
+
+logger = logging.getLogger('Parser')
+
+CHANGES_FIELDNAMES = [
+    "shop", "datetime", "article", "name", "old_price_reg", "old_price_promo",
+    "old_in_stock", "new_price_reg", "new_price_promo", "new_in_stock"
+]
+
+# (price_reg, price_promo, in_stock), цены в копейках
+PriceState = Tuple[int, int, bool]
+
+
+class PriceIndex:
+    """
+    Последнее известное состояние цен: (article, shop) -> (price_reg,
+    price_promo, in_stock).
+
+    Строится при запуске одним проходом по истории (файлы дат после сжатия и
+    products.csv) и ленте изменений, дальше обновляется по мере записи новых продуктов
+    """
+
+    def __init__(self):
+        self._index: Dict[Tuple[str, str], PriceState] = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, article: str, shop: str) -> Optional[PriceState]:
+        return self._index.get((article, shop))
+
+    @classmethod
+    def from_history(cls,
+                     db_path: str,
+                     changes_path: str = "",
+                     archive_dir: str = ""):
+        """
+        Args:
+            db_path (str): Путь к products.csv
+            changes_path (str): Путь к ленте изменений, если она ведётся. Только
+                в ней хранятся переходы "нет в наличии"
+            archive_dir (str): Каталог файлов дат, куда compact переносит
+                историю из products.csv
+        """
+        index = cls()
+        # Время последнего состояния по ключу, нужно только на время сборки,
+        # чтобы правильно смешать две истории
+        seen_at: Dict[Tuple[str, str], str] = {}
+
+        def apply(key, state, datetime_str):
+            if seen_at.get(key, "") <= datetime_str:
+                seen_at[key] = datetime_str
+                index._index[key] = state
+
+        for row in iter_history(db_path, archive_dir):
+            apply((row['article'], row['shop']),
+                  (rub_to_kopecks(row['price_reg']),
+                   rub_to_kopecks(row['price_promo']), True), row['datetime'])
+
+        if changes_path:
+            for row in _iter_rows(changes_path):
+                key = (row['article'], row['shop'])
+                if row['new_in_stock'] == '1':
+                    state = (rub_to_kopecks(row['new_price_reg']),
+                             rub_to_kopecks(row['new_price_promo']), True)
+                else:
+                    previous = index._index.get(key, (0, 0, False))
+                    state = (previous[0], previous[1], False)
+                apply(key, state, row['datetime'])
+
+        logger.info(f"Индекс цен построен, ключей: {len(index)}")
+        return index
+
+    def update(self, product: Product) -> Tuple[bool, Optional[PriceState]]:
+        """
+        Записывает новое состояние продукта
+
+        Returns:
+            Tuple: (изменилось ли состояние, предыдущее состояние или None)
+        """
+        key = (product.article, product.shop)
+        if product.in_stock:
+            state = (product.price_reg, product.price_promo, True)
+        else:
+            previous = self._index.get(key)
+            # Для отсутствующего товара цены неизвестны - сохраняем последние
+            state = (previous[0], previous[1],
+                     False) if previous else (0, 0, False)
+
+        previous = self._index.get(key)
+        self._index[key] = state
+        if previous is None:
+            # Впервые увиденный отсутствующий товар - не изменение
+            return product.in_stock, None
+        return previous != state, previous
+
+
+def _iter_rows(path: str):
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+        yield from csv.DictReader(csvfile)
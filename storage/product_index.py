@@ -0,0 +1,324 @@
+import csv
+import io
+import os
+import re
+import sqlite3
+import logging
+from hashlib import blake2b
+from typing import List, Optional, Tuple
+
+from models import parse_timestamp, rub_to_kopecks
+from storage.compaction import archive_shards
+
+logger = logging.getLogger('Parser')
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+READ_BLOCK = 8 * 1024 * 1024
+# Сколько байт перед разобранной границей читать, чтобы найти последнюю строку
+TAIL_BLOCK = 64 * 1024
+
+ROW_COLUMNS = "article, shop, ts, price_reg, price_promo, name, category"
+
+
+def name_tokens(name: str) -> List[str]:
+    return sorted(set(token.lower() for token in TOKEN_RE.findall(name)))
+
+
+def _bytes_hash(data: bytes) -> int:
+    # 7 байт, чтобы значение помещалось в INTEGER SQLite
+    return int.from_bytes(blake2b(data, digest_size=7).digest(), 'big')
+
+
+class ProductIndex:
+    """
+    Постоянные индексы по истории цен в SQLite для быстрых запросов: файлы
+    дат после compact и products.csv.
+
+    Индекс догоняет CSV инкрементально: запоминается, сколько байт файла уже
+    разобрано, и при обновлении читается только дописанный хвост. Вместе с
+    границей запоминается отпечаток файла: inode, хэш первой строки данных и
+    хэш последней разобранной строки. Если файл стал короче или отпечаток не
+    совпал (файл переписали или подменили), индекс строится заново. Файлы дат
+    меняются только при compact и целиком: если изменился их набор, размер или
+    время изменения, индекс тоже строится заново.
+
+    Таблицы:
+        rows - все строки истории, индексы по (article, shop, ts) и ts
+        latest - последнее состояние каждой пары (article, shop) с размером
+            скидки, индекс по скидке для top-N
+        tokens - слова названий продуктов -> (article, shop)
+    """
+
+    def __init__(self, index_path: str, csv_path: str, archive_dir: str = ""):
+        """
+        Args:
+            archive_dir (str): Каталог файлов дат, куда compact переносит
+                историю из products.csv
+        """
+        self.index_path = index_path
+        self.csv_path = csv_path
+        self.archive_dir = archive_dir
+        self._conn = sqlite3.connect(index_path)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS rows (
+                id INTEGER PRIMARY KEY,
+                article TEXT NOT NULL,
+                shop TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                price_reg INTEGER NOT NULL,
+                price_promo INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                category TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS rows_article_shop_ts
+                ON rows (article, shop, ts);
+            CREATE INDEX IF NOT EXISTS rows_ts ON rows (ts);
+            CREATE TABLE IF NOT EXISTS latest (
+                article TEXT NOT NULL,
+                shop TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                price_reg INTEGER NOT NULL,
+                price_promo INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                category TEXT NOT NULL,
+                discount INTEGER NOT NULL,
+                PRIMARY KEY (article, shop)
+            );
+            CREATE INDEX IF NOT EXISTS latest_discount ON latest (discount);
+            CREATE TABLE IF NOT EXISTS tokens (
+                token TEXT NOT NULL,
+                article TEXT NOT NULL,
+                shop TEXT NOT NULL,
+                PRIMARY KEY (token, article, shop)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def _get_meta(self, key: str, default: int = 0) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?",
+                                 (key, )).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value: int):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, value))
+
+    @staticmethod
+    def _identity(csvfile, offset: int) -> Tuple[int, int, int]:
+        """
+        Returns:
+            Tuple: (inode, хэш начала файла до первой строки данных
+                включительно, хэш последней строки перед offset)
+        """
+        csvfile.seek(0)
+        head = csvfile.readline()
+        if head.startswith(b"shop,"):
+            head += csvfile.readline()
+
+        start = max(0, offset - TAIL_BLOCK)
+        csvfile.seek(start)
+        block = csvfile.read(offset - start)
+        last_line = block[block.rfind(b"\n", 0, len(block) - 1) + 1:]
+
+        return (os.fstat(csvfile.fileno()).st_ino,
+                _bytes_hash(head[:offset]), _bytes_hash(last_line))
+
+    def _stored_identity(self) -> Tuple[int, int, int]:
+        return tuple(
+            self._get_meta(key)
+            for key in ("inode", "head_hash", "tail_hash"))
+
+    def _save_position(self, csvfile, offset: int):
+        self._set_meta("offset", offset)
+        for key, value in zip(("inode", "head_hash", "tail_hash"),
+                              self._identity(csvfile, offset)):
+            self._set_meta(key, value)
+
+    def _reset(self):
+        logger.info("История переписана, индекс строится заново")
+        for table in ("rows", "latest", "tokens", "meta"):
+            self._conn.execute(f"DELETE FROM {table}")
+
+    def _archive_signature(self, shards: List[str]) -> int:
+        stats = [(path, os.stat(path).st_size, os.stat(path).st_mtime_ns)
+                 for path in shards]
+        return _bytes_hash(repr(stats).encode('utf-8'))
+
+    def _csv_replaced(self) -> bool:
+        offset = self._get_meta("offset")
+        if not offset:
+            return False
+        if not os.path.exists(self.csv_path):
+            return True
+        with open(self.csv_path, 'rb') as csvfile:
+            size = os.fstat(csvfile.fileno()).st_size
+            return size < offset or self._identity(
+                csvfile, offset) != self._stored_identity()
+
+    def refresh(self) -> int:
+        """
+        Добавляет в индекс строки, дописанные в CSV с прошлого обновления.
+        Если CSV подменён или изменились файлы дат (после compact), индекс
+        строится заново по файлам дат и CSV
+
+        Returns:
+            int: Количество добавленных строк
+        """
+        added = 0
+        shards = archive_shards(self.archive_dir)
+        signature = self._archive_signature(shards)
+        if self._csv_replaced() or signature != self._get_meta("archive"):
+            self._reset()
+            for path in shards:
+                added += self._ingest_file(path, 0, track=False)
+            self._set_meta("archive", signature)
+            self._conn.commit()
+
+        if os.path.exists(self.csv_path):
+            added += self._ingest_file(self.csv_path,
+                                       self._get_meta("offset"),
+                                       track=True)
+
+        if added:
+            logger.info(f"Индекс обновлён, добавлено строк: {added}")
+        return added
+
+    def _ingest_file(self, path: str, offset: int, track: bool) -> int:
+        """
+        Разбирает файл истории с offset блоками по READ_BLOCK байт
+
+        Args:
+            track (bool): Запоминать разобранную границу и отпечаток файла
+                (для products.csv, который дописывается)
+        """
+        added = 0
+        with open(path, 'rb') as csvfile:
+            csvfile.seek(offset)
+            tail = b""
+            skip_header = offset == 0
+            while True:
+                block = csvfile.read(READ_BLOCK)
+                if not block:
+                    break
+                data = tail + block
+                # Разбираем только полные строки, остаток ждёт следующий блок
+                cut = data.rfind(b"\n") + 1
+                tail = data[cut:]
+                added += self._ingest(data[:cut].decode('utf-8'),
+                                      skip_header=skip_header)
+                skip_header = False
+                offset += cut
+                if track:
+                    position = csvfile.tell()
+                    self._save_position(csvfile, offset)
+                    csvfile.seek(position)
+                self._conn.commit()
+        return added
+
+    def _ingest(self, text: str, skip_header: bool) -> int:
+        reader = csv.reader(io.StringIO(text))
+        rows = []
+        for record in reader:
+            if skip_header and record and record[0] == "shop":
+                skip_header = False
+                continue
+            try:
+                shop, datetime_str, price_reg, price_promo, article, name, category = record
+                rows.append(
+                    (article, shop, parse_timestamp(datetime_str),
+                     rub_to_kopecks(price_reg), rub_to_kopecks(price_promo),
+                     name.strip(), category))
+            except ValueError as e:
+                logger.warning(f"Пропущена строка {record}: {e}")
+
+        self._conn.executemany(
+            f"INSERT INTO rows ({ROW_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows)
+        self._conn.executemany(
+            f"""INSERT INTO latest ({ROW_COLUMNS}, discount)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (article, shop) DO UPDATE SET
+                    ts = excluded.ts, price_reg = excluded.price_reg,
+                    price_promo = excluded.price_promo, name = excluded.name,
+                    category = excluded.category, discount = excluded.discount
+                WHERE excluded.ts >= latest.ts""",
+            [row + (row[3] - row[4], ) for row in rows])
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO tokens VALUES (?, ?, ?)",
+            [(token, row[0], row[1]) for row in rows
+             for token in name_tokens(row[5])])
+        return len(rows)
+
+    def price_at(self,
+                 article: str,
+                 at_ts: int,
+                 shop: Optional[str] = None) -> List[tuple]:
+        """Последняя известная цена на момент at_ts для каждого магазина"""
+        query = f"""SELECT {ROW_COLUMNS} FROM rows AS r
+                    WHERE article = ? AND ts = (
+                        SELECT MAX(ts) FROM rows
+                        WHERE article = r.article AND shop = r.shop AND ts <= ?)"""
+        params = [article, at_ts]
+        if shop:
+            query += " AND shop = ?"
+            params.append(shop)
+        return self._conn.execute(query + " GROUP BY shop", params).fetchall()
+
+    def history(self,
+                article: str,
+                from_ts: int,
+                to_ts: int,
+                shop: Optional[str] = None) -> List[tuple]:
+        query = f"""SELECT {ROW_COLUMNS} FROM rows
+                    WHERE article = ? AND ts BETWEEN ? AND ?"""
+        params = [article, from_ts, to_ts]
+        if shop:
+            query += " AND shop = ?"
+            params.append(shop)
+        return self._conn.execute(query + " ORDER BY shop, ts",
+                                  params).fetchall()
+
+    def article_prefix(self, prefix: str, limit: int = 50) -> List[tuple]:
+        # Диапазон по индексу вместо LIKE, который не использует индекс
+        # для кириллицы и регистронезависимого сравнения
+        return self._conn.execute(
+            f"""SELECT {ROW_COLUMNS} FROM latest
+                WHERE article >= ? AND article < ?
+                ORDER BY article LIMIT ?""",
+            (prefix, prefix + "\U0010ffff", limit)).fetchall()
+
+    def search_name(self, words: List[str], limit: int = 50) -> List[tuple]:
+        # Повторяющееся слово не должно увеличивать число требуемых совпадений
+        tokens = sorted(
+            set(token for word in words for token in name_tokens(word)))
+        if not tokens:
+            return []
+        placeholders = ",".join("?" * len(tokens))
+        return self._conn.execute(
+            f"""SELECT {ROW_COLUMNS} FROM latest
+                WHERE (article, shop) IN (
+                    SELECT article, shop FROM tokens
+                    WHERE token IN ({placeholders})
+                    GROUP BY article, shop HAVING COUNT(*) = ?)
+                ORDER BY name LIMIT ?""",
+            tokens + [len(tokens), limit]).fetchall()
+
+    def top_discounts(self,
+                      limit: int = 20,
+                      shop: Optional[str] = None) -> List[tuple]:
+        """Наибольшая разница price_reg - price_promo по последним ценам"""
+        query = f"SELECT {ROW_COLUMNS}, discount FROM latest"
+        params = []
+        if shop:
+            query += " WHERE shop = ?"
+            params.append(shop)
+        return self._conn.execute(query + " ORDER BY discount DESC LIMIT ?",
+                                  params + [limit]).fetchall()
+
+    def close(self):
+        self._conn.close()
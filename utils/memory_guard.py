@@ -0,0 +1,112 @@
+import gc
+import os
+import threading
+from logging import Logger
+from typing import Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss_mb() -> Optional[float]:
+    """
+    Текущий RSS процесса в мегабайтах: через psutil, если он установлен,
+    иначе через /proc (Linux). None - измерить не получилось
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class MemoryGuard:
+    """
+    Допуск новой работы только пока RSS процесса меньше бюджета.
+
+    Перед запуском задачи продукта вызывается acquire(), перед страницей -
+    wait(): если память превышена, сначала запускается сборщик мусора (деревья
+    BeautifulSoup содержат циклические ссылки), а затем ожидается завершение
+    уже выполняющихся задач. Если выполняющихся задач нет, задача допускается
+    в любом случае, чтобы обход не встал навсегда.
+
+    После превышения бюджета допуск остаётся ограниченным, пока RSS не
+    опустится ниже resume_fraction от бюджета: иначе у самой границы
+    освободившееся место сразу занимали бы все ждущие потоки и память снова
+    выходила бы за бюджет. Если память так и не опускается (аллокатор не
+    возвращает её системе), задачи выполняются по одной
+    """
+
+    def __init__(self,
+                 budget_mb: float,
+                 logger: Logger,
+                 poll_interval: float = 0.5,
+                 resume_fraction: float = 0.9):
+        self.budget_mb = budget_mb
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self.resume_fraction = resume_fraction
+        self.in_flight = 0
+        self.waits = 0
+        self.peak_rss_mb = 0.0
+        self.throttled = False
+        self._condition = threading.Condition()
+
+        if current_rss_mb() is None:
+            self.logger.warning(
+                "Не удаётся измерить RSS процесса, ограничение памяти отключено"
+            )
+            self.budget_mb = 0
+
+    def _rss_mb(self) -> float:
+        rss = current_rss_mb()
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        return rss
+
+    def wait(self):
+        """
+        Ждёт, пока память не вернётся в бюджет или не завершатся все
+        выполняющиеся задачи
+        """
+        with self._condition:
+            self._wait_locked()
+
+    def _wait_locked(self):
+        if not self.budget_mb:
+            return
+        if not self.throttled and self._rss_mb() > self.budget_mb:
+            self.throttled = True
+            gc.collect()
+
+        while self.throttled and self.in_flight:
+            if self._rss_mb() < self.budget_mb * self.resume_fraction:
+                self.throttled = False
+                break
+            self.waits += 1
+            self._condition.wait(self.poll_interval)
+            gc.collect()
+
+    def acquire(self):
+        """
+        Допуск задачи продукта. Сами такие задачи ничего не ждут, поэтому
+        ожидание их завершения не может зациклиться
+        """
+        with self._condition:
+            self._wait_locked()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def log_summary(self):
+        self.logger.info(
+            f"Память: бюджет {self.budget_mb} МБ, пик RSS {self.peak_rss_mb:.0f} МБ, "
+            f"ожиданий допуска {self.waits}")
@@ -0,0 +1,483 @@
+import json
+import logging
+import threading
+from time import sleep
+from urllib.parse import urljoin
+
+from db_manager import DBManager
+from parsing.parsing_processor import ParsingProcessor
+from parsing.sitemap import SitemapReader
+from parsing.identity import ProductIdentityIndex
+from parsing.scheduler import DAY, ChangeRateEstimator, RecrawlScheduler
+from parsing.stock import HOUR, StockFilter
+from parsing.priority import FetchQueue, load_watchlist
+from parsing.refresh import ConditionalRefresh
+from storage.crawl_state import CrawlState
+from distributed.task_queue import TASK_CATEGORY, TASK_LISTING, LocalTaskQueue, open_task_queue
+from distributed.nodes import Coordinator, Worker
+
+# Обработчики логов настраиваются в main.py, а не при импорте
+logger = logging.getLogger('Parser')
+emulator_logger = logging.getLogger('Emulator')
+
+
+class WineStyleParser:
+    """
+    Класс для парсинга сайта WineStyle
+    """
+
+    def __init__(self, base_url: str, db_manager: DBManager,
+                 config_path) -> None:
+        """Инициализация парсера с настройками из конфигурационного файла и базой данных.
+
+        Args:
+            db_manager (DBManager): Объект DBManager
+            config_path (str): Путь к файлу конфигурации
+        """
+        self.base_url = base_url
+        self.cat_page_url = base_url
+        self.db_manager = db_manager
+        self.city = ""
+        self.address = ""
+        self.parse_categpries = False
+        self.max_threads = 1
+        self.page_threads = 1
+        self.max_categories = 1000
+        self.max_pages = 1000
+        self.discovery = "catalogue"
+        self.sitemap_url = ""
+        self.sitemap_product_patterns = ["/products/"]
+        self.sitemap_batch_size = 500
+        self.queue_backend = "sqlite"
+        self.queue_path = "crawl_queue.db"
+        self.lease_timeout = 300
+        self.local_workers = 2
+        self.recrawl_scheduler = False
+        self.state_path = "crawl_state.db"
+        self.crawl_request_budget = 0
+        self.min_change_probability = 0.05
+        self.promo_weight = 2.0
+        self.prior_change_interval_days = 30
+        self.stock_prefilter = False
+        self.unavailable_recheck_hours = 24
+        self.priority_fetch = False
+        self.priority_category_weights = {}
+        self.priority_promo = 1.0
+        self.priority_staleness_per_day = 0.1
+        self.priority_max_staleness_days = 30
+        self.watchlist_path = ""
+        self.priority_watchlist = 10.0
+        self.conditional_refresh = False
+        self.fingerprint_max_age_days = 7
+        self.crawl_state = None
+        self.dedupe_products = False
+        self.identity_capacity = 1_000_000
+        self.identity_error_rate = 0.01
+        self.categories_path = "product_categories.csv"
+        self.config_path = config_path
+
+        self._load_config(config_path)
+        # Chrome запускается только когда нужно определить город и ТТ
+        self.browser_emulator = None
+
+        logger.info(f"Парсер инициализирован для города {self.city}")
+
+    def _load_config(self, config_path):
+        try:
+            with open(config_path, 'r', encoding='utf-8') as config_file:
+                res_json = json.load(config_file)
+
+            self.city = res_json.get('city', "")
+            self.address = res_json.get('address', "")
+            self.parse_categpries = res_json.get('parse_categories', False)
+            self.max_threads = res_json.get('threads', 1)
+            self.max_categories = res_json.get('max_categories', 1000)
+            self.max_pages = res_json.get('max_pages', 1000)
+            self.page_threads = res_json.get('page_threads', 1)
+            self.discovery = res_json.get('discovery', "catalogue")
+            self.sitemap_url = res_json.get('sitemap_url', "")
+            self.sitemap_product_patterns = res_json.get(
+                'sitemap_product_patterns', ["/products/"])
+            self.sitemap_batch_size = res_json.get('sitemap_batch_size', 500)
+            self.queue_backend = res_json.get('queue_backend', "sqlite")
+            self.queue_path = res_json.get('queue_path', "crawl_queue.db")
+            self.lease_timeout = res_json.get('lease_timeout', 300)
+            self.local_workers = res_json.get('local_workers', 2)
+            self.recrawl_scheduler = res_json.get('recrawl_scheduler', False)
+            self.state_path = res_json.get('state_path', "crawl_state.db")
+            self.crawl_request_budget = res_json.get('crawl_request_budget', 0)
+            self.min_change_probability = res_json.get(
+                'min_change_probability', 0.05)
+            self.promo_weight = res_json.get('promo_weight', 2.0)
+            self.prior_change_interval_days = res_json.get(
+                'prior_change_interval_days', 30)
+            self.stock_prefilter = res_json.get('stock_prefilter', False)
+            self.unavailable_recheck_hours = res_json.get(
+                'unavailable_recheck_hours', 24)
+            self.priority_fetch = res_json.get('priority_fetch', False)
+            self.priority_category_weights = res_json.get(
+                'priority_category_weights', {})
+            self.priority_promo = res_json.get('priority_promo', 1.0)
+            self.priority_staleness_per_day = res_json.get(
+                'priority_staleness_per_day', 0.1)
+            self.priority_max_staleness_days = res_json.get(
+                'priority_max_staleness_days', 30)
+            self.watchlist_path = res_json.get('watchlist_path', "")
+            self.priority_watchlist = res_json.get('priority_watchlist', 10.0)
+            self.conditional_refresh = res_json.get('conditional_refresh',
+                                                    False)
+            self.fingerprint_max_age_days = res_json.get(
+                'fingerprint_max_age_days', 7)
+            self.dedupe_products = res_json.get('dedupe_products', False)
+            self.identity_capacity = res_json.get('identity_capacity',
+                                                  1_000_000)
+            self.identity_error_rate = res_json.get('identity_error_rate',
+                                                    0.01)
+            self.categories_path = res_json.get('categories_path',
+                                                "product_categories.csv")
+
+            logger.info(f"Конфигурация загружена из {config_path}")
+
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке конфигурации: {e}")
+            raise
+
+    def get_products_from_category(self,
+                                   categ_link,
+                                   parse_categories,
+                                   on_results=None,
+                                   cat_name=""):
+        """
+        Функция для получения продуктов из заданной категории. Праметр parse_categories отвечает за то, парсим мы категории (и соот-но нужно ли находить подкатегории), или передаётся конечная страница категории, на которой просто нужно взять все продукты (как, например, происходит при заданной ТТ)
+        
+        Args:
+            categ_link (str): Ссылка которую нужно распарсить
+            parse_categories (bool): Нужно ли парсить категори (также необходимо, если есьт подкатегории)
+            on_results: Если задан, продукты передаются в него постранично
+            cat_name (str): Название категории для индекса продуктов
+
+        Returns:
+            List: Список продуктов, полученных по заданной категориии (и всем страницам)
+        """
+        products_list = self.parsing_processor.process_category_parallel(
+            categ_link=categ_link,
+            parse_categories=parse_categories,
+            page_threads=self.page_threads,
+            max_pages=self.max_pages,
+            on_results=on_results,
+            category=cat_name)
+
+        return products_list
+
+    def save_products_csv(self, products_list, cat_name):
+        added_count = self.db_manager.create_products(products_list, cat_name)
+        logger.info(f"Добавлено продуктов: {added_count}")
+
+    def parse_category(self, categ_link, cat_name):
+        """
+        Собирает и сохраняет продукты категории. При ограничении памяти
+        продукты сохраняются постранично, а не после обхода всей категории
+        """
+        if self.parsing_processor.memory_guard is not None:
+            self.get_products_from_category(
+                categ_link,
+                self.parse_categpries,
+                on_results=lambda products: self.save_products_csv(
+                    products, cat_name),
+                cat_name=cat_name)
+            return
+
+        products_list = self.get_products_from_category(
+            categ_link, self.parse_categpries, cat_name=cat_name)
+        self.save_products_csv(products_list, cat_name)
+
+    def parse_sitemap(self):
+        """
+        Поиск продуктов через sitemap сайта вместо обхода категорий и страниц
+        пагинации. Ссылки на продукты обрабатываются и сохраняются пачками по
+        sitemap_batch_size, чтобы не держать в памяти весь каталог
+        """
+        sitemap_url = self.sitemap_url or urljoin(self.base_url,
+                                                  "/sitemap.xml")
+        reader = SitemapReader(self.parsing_processor.network_connector,
+                               logger, self.sitemap_product_patterns)
+
+        cat_name = f"От Winestyle | Из ТТ {self.address}| Sitemap"
+        batch = []
+        for product_link in reader.iter_product_urls(sitemap_url):
+            if self.parsing_processor.discovery_deadline_passed():
+                logger.warning("Время на сбор ссылок истекло, обход sitemap прерван")
+                batch = []
+                break
+            batch.append(product_link)
+            if len(batch) >= self.sitemap_batch_size:
+                self.save_products_csv(
+                    self.parsing_processor.process_product_links(
+                        batch, cat_name), cat_name)
+                batch = []
+
+        if batch:
+            self.save_products_csv(
+                self.parsing_processor.process_product_links(batch, cat_name),
+                cat_name)
+
+    def resolve_store(self):
+        """
+        Определяет ссылки города и ТТ через эмулятор браузера
+
+        Returns:
+            Tuple: (base_url, cat_page_url), пустые строки при неудаче
+        """
+        # selenium импортируется только здесь: без эмулятора он не нужен
+        from browser_emu.emulator import Emulator
+
+        if self.browser_emulator is None:
+            self.browser_emulator = Emulator(emulator_logger, self.config_path)
+        base_url, cat_page_url = self.browser_emulator.start_emulation()
+        return base_url or "", cat_page_url or ""
+
+    def _prepare_parsing(self, store=None):
+        """
+        Определяет город и ТТ и создаёт ParsingProcessor
+
+        Args:
+            store (Tuple): Уже известные (base_url, cat_page_url), например из
+                resolve-store. Если не заданы, запускается эмулятор
+
+        Returns:
+            bool: Удалось ли подготовить парсинг
+        """
+        base_url, cat_page_url = store or self.resolve_store()
+        if not (base_url and cat_page_url):
+            logger.critical(
+                "Не удалось определить город и ТТ для парсинга, завершаю работу"
+            )
+            return False
+
+        self.base_url, self.cat_page_url = base_url, cat_page_url
+        self.parsing_processor = ParsingProcessor(
+            self.base_url,
+            self.cat_page_url,
+            logger,
+            self.config_path,
+            scheduler=self._create_scheduler(),
+            identity=self._create_identity(),
+            stock_filter=self._create_stock_filter(),
+            fetch_queue=self._create_fetch_queue(),
+            refresh=self._create_refresh())
+        return True
+
+    def _get_crawl_state(self):
+        # Одно состояние обхода на планировщик и фильтр наличия
+        if self.crawl_state is None:
+            self.crawl_state = CrawlState(self.state_path)
+        return self.crawl_state
+
+    def _create_identity(self):
+        if not self.dedupe_products:
+            return None
+
+        return ProductIdentityIndex(logger, self.identity_capacity,
+                                    self.identity_error_rate)
+
+    def _create_scheduler(self):
+        if not self.recrawl_scheduler:
+            return None
+
+        estimator = ChangeRateEstimator.from_history(
+            self.db_manager.db_path,
+            self.prior_change_interval_days * DAY,
+            self.db_manager.archive_path)
+        return RecrawlScheduler(self._get_crawl_state(),
+                                estimator,
+                                self.address,
+                                logger,
+                                request_budget=self.crawl_request_budget,
+                                min_change_probability=self.min_change_probability,
+                                promo_weight=self.promo_weight)
+
+    def _create_stock_filter(self):
+        if not self.stock_prefilter:
+            return None
+
+        # Отметки об отсутствии пишутся, только когда отслеживаются изменения
+        return StockFilter(
+            self._get_crawl_state(),
+            self.address,
+            logger,
+            report_out_of_stock=self.db_manager.price_index is not None,
+            recheck_interval=self.unavailable_recheck_hours * HOUR)
+
+    def _create_fetch_queue(self):
+        if not self.priority_fetch:
+            return None
+
+        return FetchQueue(
+            self._get_crawl_state(),
+            self.address,
+            logger,
+            category_weights=self.priority_category_weights,
+            promo_priority=self.priority_promo,
+            staleness_priority=self.priority_staleness_per_day,
+            max_staleness_days=self.priority_max_staleness_days,
+            watchlist=load_watchlist(self.watchlist_path),
+            watchlist_priority=self.priority_watchlist)
+
+    def _create_refresh(self):
+        if not self.conditional_refresh:
+            return None
+
+        return ConditionalRefresh(self._get_crawl_state(),
+                                  self.address,
+                                  logger,
+                                  max_age=self.fingerprint_max_age_days * DAY)
+
+    def _select_categories(self):
+        categories_links = self.parsing_processor.get_catalogue_categories()
+        logger.info(f"Найдены категории: {categories_links}")
+
+        categories_items = list(categories_links.items())
+        selected_categories = categories_items[
+            1:min(self.max_categories, len(categories_items)) +
+            1]  # Пропускаем секцию с акционными товарами и идём до кол-ва категорий указанных в конфиге. Если оно будет больше, то мы просто будем идти по всем найденным дабы не было ошибки
+        return selected_categories
+
+    def Parse(self, store=None):
+        logger.info("Начало парсинга")
+        if not self._prepare_parsing(store):
+            return
+
+        if self.discovery == "sitemap":
+            self.parse_sitemap()
+
+        elif self.parse_categpries:
+            for category_name, categ_link in self._select_categories():
+                self.parse_category(categ_link,
+                                    f"От Winestyle | {category_name}")
+
+        else:
+            self.parse_category(self.cat_page_url,
+                                f"От Winestyle | Из ТТ {self.address}| Все")
+
+        # Ссылки со всех страниц собраны - загружаем продукты по приоритету
+        if self.parsing_processor.fetch_queue is not None:
+            self.parsing_processor.drain_fetch_queue(self.save_products_csv)
+
+        if self.parsing_processor.deadline_skipped:
+            logger.warning(
+                "Время запуска истекло, пропущено страниц продуктов: "
+                f"{self.parsing_processor.deadline_skipped}")
+
+        if self.parsing_processor.memory_guard is not None:
+            self.parsing_processor.memory_guard.log_summary()
+
+        identity = self.parsing_processor.identity
+        if identity is not None:
+            identity.write_categories(self.categories_path, self.address)
+            identity.close()
+
+        scheduler = self.parsing_processor.scheduler
+        if scheduler is not None:
+            scheduler.log_summary()
+
+        if self.parsing_processor.stock_filter is not None:
+            self.parsing_processor.stock_filter.log_summary()
+
+        if self.parsing_processor.refresh is not None:
+            self.parsing_processor.refresh.log_summary()
+
+        if self.crawl_state is not None:
+            self.crawl_state.close()
+
+    def Coordinate(self, task_queue, store=None):
+        """
+        Режим координатора: ставит стартовые страницы в общую очередь и
+        сохраняет результаты воркеров. Для локальной очереди воркеры
+        запускаются потоками в этом же процессе
+        """
+        logger.info("Начало парсинга в режиме координатора")
+        if not self._prepare_parsing(store):
+            return
+
+        if self.parse_categpries:
+            start_pages = [(TASK_CATEGORY, categ_link,
+                            f"От Winestyle | {category_name}")
+                           for category_name, categ_link in
+                           self._select_categories()]
+        else:
+            start_pages = [(TASK_LISTING, self.cat_page_url,
+                            f"От Winestyle | Из ТТ {self.address}| Все")]
+
+        coordinator = Coordinator(task_queue, self.db_manager, logger)
+        run_id = coordinator.seed(self.base_url, self.cat_page_url,
+                                  start_pages)
+
+        local_workers = []
+        if isinstance(task_queue, LocalTaskQueue):
+            for num in range(self.local_workers):
+                worker = Worker(task_queue,
+                                self.parsing_processor,
+                                logger,
+                                worker_id=f"local-{num}",
+                                threads=self.parsing_processor.product_threads,
+                                max_pages=self.max_pages,
+                                run_id=run_id)
+                thread = threading.Thread(target=worker.run, daemon=True)
+                thread.start()
+                local_workers.append(thread)
+
+        coordinator.collect()
+        for thread in local_workers:
+            thread.join()
+
+
+def run_worker(config_path):
+    """
+    Режим воркера: эмулятор не запускается, город и ТТ берутся из очереди,
+    куда их записал координатор
+    """
+    with open(config_path, 'r', encoding='utf-8') as config_file:
+        res_json = json.load(config_file)
+
+    task_queue = open_task_queue(res_json.get('queue_backend', "sqlite"),
+                                 res_json.get('queue_path', "crawl_queue.db"),
+                                 res_json.get('lease_timeout', 300))
+
+    # Файл очереди хранится между запусками: ждём запуск, который ещё идёт
+    while (task_queue.get_meta("run_id") is None
+           or task_queue.get_meta("finished", False)):
+        logger.info("Ожидание координатора...")
+        sleep(5)
+
+    crawl_state = None
+    stock_filter = None
+    if res_json.get('stock_prefilter', False):
+        crawl_state = CrawlState(res_json.get('state_path', "crawl_state.db"))
+        stock_filter = StockFilter(
+            crawl_state,
+            res_json.get('address', ""),
+            logger,
+            report_out_of_stock=bool(
+                res_json.get('delta_output', False)
+                or res_json.get('changes_path', "")),
+            recheck_interval=res_json.get('unavailable_recheck_hours', 24) *
+            HOUR)
+
+    parsing_processor = ParsingProcessor(task_queue.get_meta("base_url"),
+                                         task_queue.get_meta("cat_page_url"),
+                                         logger,
+                                         config_path,
+                                         stock_filter=stock_filter)
+    worker = Worker(task_queue,
+                    parsing_processor,
+                    logger,
+                    worker_id=res_json.get('worker_id', ""),
+                    threads=parsing_processor.product_threads,
+                    max_pages=res_json.get('max_pages', 1000),
+                    run_id=task_queue.get_meta("run_id"))
+    worker.run()
+    task_queue.close()
+    if crawl_state is not None:
+        stock_filter.log_summary()
+        crawl_state.close()
+